@@ -0,0 +1,187 @@
+"""
+Benchmarks for the device manager against a simulated BlueZ stack.
+
+Run from the top of the source tree with::
+
+    python -m benchmarks.bench
+
+Startup time, ``get_devices()`` latency, signal throughput and connection
+times are measured for each of the ``--devices`` counts.  Memory is
+reported as the growth in peak resident set size, so only increases show
+up and runs are best compared with the same arguments.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import ConfigParser
+import gc
+import logging
+import os
+import resource
+import time
+
+from . import fakebluez
+
+bluez = fakebluez.install()
+
+import mopidy_btmanager  # noqa
+from mopidy_btmanager import Extension  # noqa
+from mopidy_btmanager.actor import BTDeviceManager  # noqa
+
+
+def make_config(**overrides):
+    parser = ConfigParser.RawConfigParser()
+    parser.read(os.path.join(os.path.dirname(mopidy_btmanager.__file__), 'ext.conf'))
+    raw = dict(parser.items('btmanager'))
+    values, errors = Extension().get_config_schema().deserialize(raw)
+    if (errors):
+        raise ValueError(errors)
+    values.update({'cache_file': None}, **overrides)
+    return {'btmanager': values}
+
+
+def make_manager(devices, **overrides):
+    bluez.clear()
+    bluez.connect_delay = 0
+    bluez.failing.clear()
+    bluez.add_devices(devices)
+    return BTDeviceManager(make_config(**overrides), None)
+
+
+def ms(seconds):
+    if (seconds is None):
+        return '-'
+    return '%.2fms' % (seconds * 1000)
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def wait_for_events(manager, timeout=30):
+    deadline = time.time() + timeout
+    while (manager.events.stats()['queued'] and time.time() < deadline):
+        time.sleep(0.001)
+
+
+def bench_startup(counts, fast_start):
+    print('startup (fast_start=%s)' % fast_start)
+    for count in counts:
+        manager = make_manager(count, fast_start=fast_start)
+        gc.collect()
+        rss = peak_rss_kb()
+        started = time.time()
+        manager.on_start()
+        returned = time.time() - started
+        fakebluez.pump(until=lambda: manager.enumeration is None)
+        enumerated = time.time() - started
+        print('  devices=%-5d on_start=%8.2fms enumerated=%8.2fms '
+              'peak_rss_growth=%dkB' % (count, returned * 1000, enumerated * 1000,
+                                        peak_rss_kb() - rss))
+        manager.on_stop()
+
+
+def bench_get_devices(counts, repeat):
+    print('get_devices (%d calls)' % repeat)
+    for count in counts:
+        manager = make_manager(count)
+        manager.on_start()
+        started = time.time()
+        for i in range(repeat):
+            manager.get_devices()
+        elapsed = (time.time() - started) / repeat
+        print('  devices=%-5d latency=%8.3fms' % (count, elapsed * 1000))
+        manager.on_stop()
+
+
+def bench_signals(counts, signals):
+    print('signals (%d of each)' % signals)
+    for count in counts:
+        manager = make_manager(count)
+        manager.on_start()
+        paths = sorted(bluez.devices)
+        addrs = [bluez.devices[path]['Address'] for path in paths]
+
+        started = time.time()
+        for i in range(signals):
+            bluez.emit_property_changed(paths[i % count], 'RSSI', -40 - i % 50)
+        handled = time.time() - started
+        wait_for_events(manager)
+        delivered = time.time() - started
+        print('  devices=%-5d PropertyChanged handled=%8.0f/s delivered=%8.0f/s' %
+              (count, signals / handled, signals / delivered))
+
+        started = time.time()
+        for i in range(signals):
+            bluez.emit_device_found(addrs[i % count], rssi=-40 - i % 50)
+        handled = time.time() - started
+        print('  devices=%-5d DeviceFound     handled=%8.0f/s' %
+              (count, signals / handled))
+
+        started = time.time()
+        for i in range(count):
+            bluez.emit_device_created(fakebluez.FakeBluez.address(count + i))
+        handled = time.time() - started
+        print('  devices=%-5d DeviceCreated   handled=%8.0f/s' %
+              (count, count / handled))
+
+        wait_for_events(manager)
+        events = manager.events.stats()
+        print('  devices=%-5d events delivered=%d merged=%d dropped=%d' %
+              (count, events['delivered'], events['merged'], events['dropped']))
+        manager.on_stop()
+
+
+def bench_connect(counts, delay, failure_rate):
+    print('connect (reply after %dms, %d%% failing)' % (delay * 1000,
+                                                         failure_rate * 100))
+    for count in counts:
+        manager = make_manager(count, autoconnect=False)
+        manager.on_start()
+        devices = manager.get_devices()
+        if (failure_rate > 0):
+            step = int(round(1 / failure_rate))
+            bluez.failing.update(dev['addr'] for dev in devices[::step])
+        bluez.connect_delay = delay
+        started = time.time()
+        for dev in devices:
+            manager.connect(dev)
+        fakebluez.pump(until=lambda: not any(manager.connector.is_connecting(dev['addr'])
+                                             for dev in devices), timeout=60)
+        elapsed = time.time() - started
+        stats = manager.get_stats()
+        latency = stats['latency'].get('time_to_connected', {})
+        print('  devices=%-5d total=%8.2fms connected=%d failed=%d '
+              'time_to_connected p50=%s p90=%s' %
+              (count, elapsed * 1000,
+               stats['counters'].get('connect_success', 0),
+               stats['counters'].get('connect_failure', 0),
+               ms(latency.get('p50')), ms(latency.get('p90'))))
+        manager.on_stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--devices', default='10,100,1000',
+                        help='comma separated device counts')
+    parser.add_argument('--signals', type=int, default=10000,
+                        help='signals of each type to emit')
+    parser.add_argument('--repeat', type=int, default=100,
+                        help='get_devices() calls per device count')
+    parser.add_argument('--connect-delay', type=float, default=0.05,
+                        help='simulated profile connect time in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.1,
+                        help='fraction of devices whose connects fail')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    counts = [int(count) for count in args.devices.split(',')]
+
+    bench_startup(counts, fast_start=False)
+    bench_startup(counts, fast_start=True)
+    bench_get_devices(counts, args.repeat)
+    bench_signals(counts, args.signals)
+    bench_connect(counts, args.connect_delay, args.failure_rate)
+
+
+if __name__ == '__main__':
+    main()
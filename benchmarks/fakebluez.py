@@ -0,0 +1,381 @@
+"""
+Simulated BlueZ stack for running the device manager without radios.
+
+:func:`install` puts stand-ins for the ``bt_manager`` and ``dbus``
+modules into ``sys.modules``, so it must be called before
+:mod:`mopidy_btmanager.actor` is imported.  Devices live in a
+:class:`FakeBluez` instance, which can emit adapter and device signals in
+bulk and answers profile connects after ``connect_delay`` seconds,
+failing those of devices listed in ``failing``.  Replies and timers run
+on the default GLib main context, which :func:`pump` drives.
+"""
+from __future__ import unicode_literals
+
+import sys
+import time
+import types
+
+import gobject
+
+ADAPTER_ROOT = '/org/bluez/1'
+
+AUDIO_SINK_UUID = '0000110b-0000-1000-8000-00805f9b34fb'
+AUDIO_SOURCE_UUID = '0000110a-0000-1000-8000-00805f9b34fb'
+AV_REMOTE_UUID = '0000110e-0000-1000-8000-00805f9b34fb'
+HID_UUID = '00001124-0000-1000-8000-00805f9b34fb'
+
+SIGNAL_PROPERTY_CHANGED = 'PropertyChanged'
+SIGNAL_DEVICE_FOUND = 'DeviceFound'
+SIGNAL_DEVICE_DISAPPEARED = 'DeviceDisappeared'
+SIGNAL_DEVICE_CREATED = 'DeviceCreated'
+SIGNAL_DEVICE_REMOVED = 'DeviceRemoved'
+
+
+class FakeBluez(object):
+    """
+    Devices and signal receivers of the simulated bluetooth daemon
+    """
+    def __init__(self, connect_delay=0.0):
+        self.connect_delay = connect_delay
+        self.failing = set()
+        self.devices = {}
+        self.adapters = {}
+        self.bus_receivers = []
+        self.connects = 0
+        self.property_reads = 0
+        self.agents = {}
+
+    @staticmethod
+    def adapter_path(adapter_id='hci0'):
+        return '%s/%s' % (ADAPTER_ROOT, adapter_id)
+
+    @staticmethod
+    def device_path(addr, adapter_id='hci0'):
+        return '%s/dev_%s' % (FakeBluez.adapter_path(adapter_id),
+                              addr.replace(':', '_'))
+
+    @staticmethod
+    def address(i):
+        return ':'.join('%02X' % ((i >> shift) & 0xff)
+                        for shift in (40, 32, 24, 16, 8, 0))
+
+    def add_device(self, addr, name=None, uuids=(AUDIO_SINK_UUID,),
+                   adapter_id='hci0', **props):
+        path = FakeBluez.device_path(addr, adapter_id)
+        self.devices[path] = dict({'Address': addr,
+                                   'Name': name or 'Device %s' % addr,
+                                   'Alias': name or 'Device %s' % addr,
+                                   'UUIDs': list(uuids),
+                                   'Paired': True,
+                                   'Trusted': True,
+                                   'Connected': False,
+                                   'Class': 0x240404}, **props)
+        return path
+
+    def add_devices(self, count, adapter_id='hci0', **props):
+        return [self.add_device(FakeBluez.address(i), adapter_id=adapter_id, **props)
+                for i in range(count)]
+
+    def clear(self):
+        self.devices.clear()
+        self.agents.clear()
+
+    def find_device(self, addr, adapter_id='hci0'):
+        path = FakeBluez.device_path(addr, adapter_id)
+        if (path not in self.devices):
+            raise Exception('org.bluez.Error.DoesNotExist: %s' % addr)
+        return path
+
+    def get_properties(self, path):
+        self.property_reads += 1
+        try:
+            return dict(self.devices[path])
+        except KeyError:
+            raise Exception('org.freedesktop.DBus.Error.UnknownObject: %s' % path)
+
+    def _adapter_receivers(self, signal_name):
+        for adapter in self.adapters.values():
+            receiver = adapter.receivers.get(signal_name)
+            if (receiver is not None):
+                yield receiver
+
+    def emit_property_changed(self, path, name, value):
+        self.devices[path][name] = value
+        for handler, signal_name in list(self.bus_receivers):
+            if (signal_name == SIGNAL_PROPERTY_CHANGED):
+                handler(name, value, path=path)
+
+    def emit_device_found(self, addr, rssi=-60, uuids=(AUDIO_SINK_UUID,)):
+        info = {'Address': addr, 'Name': 'Device %s' % addr,
+                'UUIDs': list(uuids), 'RSSI': rssi}
+        for handler, user_arg in self._adapter_receivers(SIGNAL_DEVICE_FOUND):
+            handler(SIGNAL_DEVICE_FOUND, user_arg, addr, info)
+
+    def emit_device_created(self, addr, adapter_id='hci0'):
+        path = self.add_device(addr, adapter_id=adapter_id)
+        for handler, user_arg in self._adapter_receivers(SIGNAL_DEVICE_CREATED):
+            handler(SIGNAL_DEVICE_CREATED, user_arg, path)
+        return path
+
+    def emit_device_removed(self, path):
+        self.devices.pop(path, None)
+        for handler, user_arg in self._adapter_receivers(SIGNAL_DEVICE_REMOVED):
+            handler(SIGNAL_DEVICE_REMOVED, user_arg, path)
+
+    def connect_profile(self, path, reply_handler, error_handler):
+        self.connects += 1
+
+        def reply():
+            if (self.devices.get(path, {}).get('Address') in self.failing):
+                error_handler(Exception('org.bluez.Error.ConnectionAttemptFailed'))
+            else:
+                self.emit_property_changed(path, 'Connected', True)
+                reply_handler()
+            return False
+        gobject.timeout_add(int(self.connect_delay * 1000), reply)
+
+    def disconnect_device(self, path, reply_handler, error_handler):
+        def reply():
+            if (path not in self.devices):
+                error_handler(Exception('org.freedesktop.DBus.Error.UnknownObject'))
+            else:
+                self.emit_property_changed(path, 'Connected', False)
+                reply_handler()
+            return False
+        gobject.timeout_add(int(self.connect_delay * 1000), reply)
+
+
+bluez = FakeBluez()
+
+
+class _SignalSource(object):
+    def __init__(self):
+        self.receivers = {}
+
+    def add_signal_receiver(self, handler, signal_name, user_arg=None):
+        self.receivers[signal_name] = (handler, user_arg)
+
+    def remove_signal_receiver(self, signal_name):
+        self.receivers.pop(signal_name, None)
+
+
+class BTAdapter(_SignalSource):
+    SIGNAL_PROPERTY_CHANGED = SIGNAL_PROPERTY_CHANGED
+    SIGNAL_DEVICE_FOUND = SIGNAL_DEVICE_FOUND
+    SIGNAL_DEVICE_DISAPPEARED = SIGNAL_DEVICE_DISAPPEARED
+    SIGNAL_DEVICE_CREATED = SIGNAL_DEVICE_CREATED
+    SIGNAL_DEVICE_REMOVED = SIGNAL_DEVICE_REMOVED
+
+    def __init__(self, adapter_path=None, adapter_id=None):
+        _SignalSource.__init__(self)
+        if (adapter_path is None):
+            adapter_path = FakeBluez.adapter_path(adapter_id or 'hci0')
+        elif (not adapter_path.startswith(ADAPTER_ROOT + '/')):
+            raise Exception('org.freedesktop.DBus.Error.UnknownObject: %s' %
+                            adapter_path)
+        self.path = adapter_path
+        self.id = adapter_path.rsplit('/', 1)[-1]
+        self.Powered = False
+        self.Name = 'fake'
+        bluez.adapters[self.id] = self
+
+    def list_devices(self):
+        return [path for path in bluez.devices if path.startswith(self.path + '/')]
+
+    def start_discovery(self):
+        pass
+
+    def stop_discovery(self):
+        pass
+
+    def create_paired_device(self, addr, agent_path, caps, reply_handler,
+                             error_handler):
+        path = bluez.add_device(addr, adapter_id=self.id)
+        gobject.idle_add(lambda: reply_handler(path) and False)
+
+    def find_device(self, addr):
+        return bluez.find_device(addr, self.id)
+
+    def remove_device(self, path):
+        bluez.devices.pop(path, None)
+
+    def register_agent(self, path, capability):
+        bluez.agents[self.id] = (path, capability)
+
+    def unregister_agent(self, path):
+        bluez.agents.pop(self.id, None)
+
+
+def _device_path(dev_path=None, dev_id=None, adapter_path=None, adapter_id=None):
+    if (dev_path):
+        return str(dev_path)
+    if (dev_id):
+        if (adapter_path is not None):
+            adapter_id = adapter_path.rsplit('/', 1)[-1]
+        return bluez.find_device(dev_id, adapter_id or 'hci0')
+    raise Exception('BTDeviceNotSpecifiedException')
+
+
+class BTDevice(_SignalSource):
+    def __init__(self, dev_path=None, dev_id=None, adapter_path=None,
+                 adapter_id=None):
+        self.__dict__['receivers'] = {}
+        self.__dict__['path'] = _device_path(dev_path, dev_id, adapter_path, adapter_id)
+        self.__dict__['_interface'] = self
+        # As in bt_manager, opening the device reads its properties
+        bluez.get_properties(self.path)
+
+    def __getattr__(self, name):
+        try:
+            return bluez.devices[self.__dict__['path']][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        bluez.devices[self.path][name] = value
+
+    def get_property(self, name=None):
+        props = bluez.devices[self.path]
+        if (name is None):
+            return dict(props)
+        return props[name]
+
+    def set_property(self, name, value):
+        bluez.emit_property_changed(self.path, name, value)
+
+    def discover_services(self):
+        return {}
+
+    def disconnect(self):
+        bluez.emit_property_changed(self.path, 'Connected', False)
+
+    def Disconnect(self, reply_handler=None, error_handler=None, timeout=None):
+        bluez.disconnect_device(self.path, reply_handler, error_handler)
+
+
+class _Profile(object):
+    # bluetoothd only offers a profile's interface on devices with one of
+    # these UUIDs, and opening the profile reads its properties, so it
+    # fails on other devices as it does with bt_manager
+    UUIDS = ()
+
+    def __init__(self, dev_path=None, dev_id=None, adapter_path=None,
+                 adapter_id=None):
+        self.path = _device_path(dev_path, dev_id, adapter_path, adapter_id)
+        uuids = bluez.get_properties(self.path).get('UUIDs', [])
+        if (not set(uuids) & set(self.UUIDS)):
+            raise Exception('org.freedesktop.DBus.Error.UnknownMethod: '
+                            'GetProperties is not offered by %s on %s' %
+                            (type(self).__name__, self.path))
+        self._interface = self
+
+    def Connect(self, reply_handler=None, error_handler=None, timeout=None):
+        bluez.connect_profile(self.path, reply_handler, error_handler)
+
+    def disconnect(self):
+        pass
+
+
+class BTAudioSink(_Profile):
+    UUIDS = (AUDIO_SINK_UUID,)
+
+
+class BTAudioSource(_Profile):
+    UUIDS = (AUDIO_SOURCE_UUID,)
+
+
+class BTInput(_Profile):
+    UUIDS = (HID_UUID,)
+
+
+class BTAgent(object):
+    def __init__(self, path=None, **kwargs):
+        self.path = path
+
+    def remove_from_connection(self):
+        pass
+
+
+class BTUUID(object):
+    def __init__(self, uuid):
+        self.uuid16 = int(uuid[4:8], 16)
+
+
+class _Service(object):
+    def __init__(self, name):
+        self.name = name
+
+
+SERVICES = {
+    0x110a: _Service('AudioSource'),
+    0x110b: _Service('AudioSink'),
+    0x110e: _Service('AVRemoteControl'),
+    0x1124: _Service('HumanInterfaceDeviceService'),
+}
+
+
+class _DeviceObject(object):
+    def __init__(self, path):
+        self.path = str(path)
+
+    def GetProperties(self):
+        return bluez.get_properties(self.path)
+
+
+class _SystemBus(object):
+    def get_object(self, service, path):
+        return _DeviceObject(path)
+
+    def add_signal_receiver(self, handler, signal_name=None, *args, **kwargs):
+        bluez.bus_receivers.append((handler, signal_name))
+
+    def remove_signal_receiver(self, handler, signal_name=None, *args, **kwargs):
+        if ((handler, signal_name) in bluez.bus_receivers):
+            bluez.bus_receivers.remove((handler, signal_name))
+
+
+class _String(type('')):
+    # As with dbus-python's types, e.g. for mopidy.config.keyring
+    def __new__(cls, value='', variant_level=0):
+        return type('').__new__(cls, value)
+
+
+class _UInt32(int):
+    def __new__(cls, value=0, variant_level=0):
+        return int.__new__(cls, value)
+
+
+def install():
+    """
+    Replace the ``bt_manager`` and ``dbus`` modules with the simulation
+    """
+    bt_manager = types.ModuleType(str('bt_manager'))
+    for name in ('BTAdapter', 'BTDevice', 'BTAudioSink', 'BTAudioSource',
+                 'BTInput', 'BTAgent', 'BTUUID', 'SERVICES'):
+        setattr(bt_manager, name, globals()[name])
+    dbus = types.ModuleType(str('dbus'))
+    dbus.String = _String
+    dbus.UInt32 = _UInt32
+    dbus.Interface = lambda obj, interface: obj
+    system_bus = _SystemBus()
+    dbus.SystemBus = lambda: system_bus
+    sys.modules['bt_manager'] = bt_manager
+    sys.modules['dbus'] = dbus
+    return bluez
+
+
+def pump(until=None, timeout=10):
+    """
+    Run the GLib main context until nothing is pending, or until the
+    ``until`` callable returns True
+    """
+    context = gobject.main_context_default()
+    deadline = time.time() + timeout
+    while (time.time() < deadline):
+        if (until is not None and until()):
+            return True
+        if (not context.iteration(False)):
+            if (until is None):
+                return True
+            time.sleep(0.001)
+    return False
@@ -6,6 +6,36 @@ from mopidy import config, ext, exceptions
 
 __version__ = '0.1.0'
 
+# Names of the sink profiles in sink.SINK_PROFILES, which is only
+# imported along with GStreamer once an audio sink is needed
+SINK_PROFILE_NAMES = ['default', 'low_latency', 'high_quality', 'adaptive']
+
+
+def parse_sink_device_profile(value):
+    """
+    Split an ``address=profile`` entry into an upper case address and a
+    sink profile, raising ValueError if it isn't one
+    """
+    addr, sep, profile = value.partition('=')
+    addr = addr.strip().upper()
+    profile = profile.strip()
+    if (not sep or not addr):
+        raise ValueError('expected address=profile, got %s' % value)
+    if (profile not in SINK_PROFILE_NAMES):
+        raise ValueError('unknown sink profile %s' % profile)
+    return addr, profile
+
+
+class SinkDeviceProfiles(config.List):
+    """
+    List of ``address=profile`` entries naming known sink profiles
+    """
+    def deserialize(self, value):
+        values = super(SinkDeviceProfiles, self).deserialize(value)
+        for i in values:
+            parse_sink_device_profile(i)
+        return values
+
 
 class Extension(ext.Extension):
 
@@ -20,9 +50,35 @@ class Extension(ext.Extension):
     def get_config_schema(self):
         schema = super(Extension, self).get_config_schema()
         schema['name'] = config.String()
+        schema['adapters'] = config.List(optional=True)
         schema['pincode'] = config.String()
         schema['autoconnect'] = config.Boolean()
+        schema['autoconnect_priority'] = config.List(optional=True)
+        schema['autoconnect_concurrency'] = config.Integer(minimum=1)
+        schema['autoconnect_backoff'] = config.Integer(minimum=1)
+        schema['autoconnect_backoff_max'] = config.Integer(minimum=1)
         schema['attach_audio_sink'] = config.Boolean()
+        schema['audio_sink_mode'] = config.String(choices=['single', 'group'])
+        schema['audio_sink_select'] = config.String(choices=['all', 'strongest'])
+        schema['sink_profile'] = config.String(choices=SINK_PROFILE_NAMES)
+        schema['sink_device_profiles'] = SinkDeviceProfiles(optional=True)
+        schema['sink_pool_size'] = config.Integer(minimum=0)
+        schema['sink_pool_max_age'] = config.Integer(minimum=0)
+        schema['sink_grace_period'] = config.Integer(minimum=0)
+        schema['fast_start'] = config.Boolean()
+        schema['cache_file'] = config.Path(optional=True)
+        schema['discovery_burst'] = config.Integer(minimum=0)
+        schema['discovery_idle'] = config.Integer(minimum=0)
+        schema['discovery_idle_max'] = config.Integer(minimum=0)
+        schema['discovery_window'] = config.Integer(minimum=0)
+        schema['discovery_rssi_delta'] = config.Integer(minimum=0)
+        schema['connect_timeout'] = config.Integer(minimum=1)
+        schema['pair_timeout'] = config.Integer(minimum=0)
+        schema['link_window'] = config.Integer(minimum=2)
+        schema['link_rssi_threshold'] = config.Integer()
+        schema['event_queue_size'] = config.Integer(minimum=1)
+        schema['change_feed_size'] = config.Integer(minimum=1)
+        schema['stats_interval'] = config.Integer(minimum=0)
         return schema
 
     def validate_environment(self):
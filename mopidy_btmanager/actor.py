@@ -1,10 +1,28 @@
 from __future__ import unicode_literals
 
+import functools
 import logging
+import threading
+import time
+import zlib
 import pykka
 import bt_manager
 import dbus
-from .sink import BluetoothA2DPSink
+import gobject
+from . import SINK_PROFILE_NAMES, parse_sink_device_profile
+from .adapters import AdapterState, DEFAULT_ADAPTER_ID, least_loaded
+from .cache import DeviceCache
+from .caps import CapabilityCache, service_to_capability
+from .changes import CHANGE_ADDED, CHANGE_REMOVED, CHANGE_UPDATED, ChangeFeed
+from .connect import ConnectEngine, STATE_CONNECTING, STATE_FAILED
+from .discovery import DiscoveryCoalescer, DiscoveryScheduler
+from .events import EventDispatcher
+from .lifecycle import SinkLifecycle
+from .linkquality import LinkMonitor
+from .pairing import PairingTable
+from .registry import DeviceRegistry, normalize_address, path_to_address
+from .scheduler import AutoconnectScheduler
+from .stats import Stats
 
 from mopidy import exceptions, service
 from mopidy.utils.jsonrpc import private_method
@@ -12,6 +30,24 @@ from mopidy.utils.jsonrpc import private_method
 logger = logging.getLogger(__name__)
 
 BLUETOOTH_SERVICE_NAME = 'bluetooth'
+BLUEZ_SERVICE_NAME = 'org.bluez'
+BLUEZ_DEVICE_INTERFACE = 'org.bluez.Device'
+AGENT_PATH = '/mopidy/agent'
+AGENT_CAPABILITY = 'DisplayYesNo'
+
+# Device properties kept in the device cache
+CACHED_PROPERTIES = ('Name', 'UUIDs', 'Paired')
+
+# bt_manager profile classes connected for each device capability, in
+# connection order
+PROFILE_CLASSES = [
+    ('AudioSink', 'BTAudioSink'),
+    ('AudioSource', 'BTAudioSource'),
+    ('InputControl', 'BTInput'),
+]
+
+# Shared UUID to capability translation table
+capability_cache = CapabilityCache()
 
 
 class BTDeviceManager(pykka.ThreadingActor, service.Service):
@@ -35,64 +71,258 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         self.name = BLUETOOTH_SERVICE_NAME
         self.public = True
         self.config = dict(config['btmanager'])
-        self.devices = {}
+        self.devices = DeviceRegistry()
         self.autoconnect = self.config['autoconnect']
         self.core = core
+        self.adapter = None
+        self.adapters = []
+        self.enumeration = None
+        self.sink_groups = {}
+        self.audio_sinks = {}
+        self.sink_profiles = {}
+        self.sink_caps = {}
+        self.default_sink_profile = 'default'
+        self._load_sink_profiles()
+        self.sink_pool = None
+        self.sink_lifecycle = SinkLifecycle(self._expire_audio_sink)
+        self.cache = None
+        self.events = EventDispatcher()
+        self.changes = ChangeFeed()
+        self.stats = Stats()
+        self.agent = None
+        self.pairings = PairingTable(on_timeout=self._on_pairing_timeout)
+        self.coalescer = DiscoveryCoalescer()
+        self.connector = ConnectEngine(on_complete=self._on_connect_complete)
+        self.links = LinkMonitor()
+        self.scheduler = AutoconnectScheduler(self._autoconnect_device,
+                                              key_fn=self.links.sort_key)
+        self.discovery = DiscoveryScheduler(self._start_discovery,
+                                            self._stop_discovery,
+                                            self._is_streaming)
+        self.autoconnect_suppressed = 0
+        self.status_properties = {
+            'discovery_stats': self._get_discovery_stats,
+            'autoconnect_stats': self.scheduler.stats,
+            'adapter_stats': self.get_adapters,
+            'discovery_duty_cycle': self._get_discovery_duty_cycle,
+            'discovery_inquiry_time': self.discovery.total_inquiry_time,
+            'sink_pool_stats': self._get_sink_pool_stats,
+            'sink_stats': self._get_sink_stats,
+            'pairing_stats': self.pairings.stats,
+            'link_quality': self.links.stats,
+            'event_stats': self.events.stats,
+            'stats': self.get_stats,
+        }
+        self.property_handlers = {
+            'name': self._apply_name,
+            'pincode': self._apply_pincode,
+            'autoconnect': self._apply_autoconnect,
+            'autoconnect_priority': self._apply_scheduler_config,
+            'autoconnect_concurrency': self._apply_scheduler_config,
+            'autoconnect_backoff': self._apply_scheduler_config,
+            'autoconnect_backoff_max': self._apply_scheduler_config,
+            'attach_audio_sink': self._apply_attach_audio_sink,
+            'sink_profile': self._apply_sink_profile,
+            'sink_device_profiles': self._apply_sink_profile,
+            'audio_sink_mode': self._apply_sink_profile,
+            'sink_pool_size': self._apply_sink_pool,
+            'sink_pool_max_age': self._apply_sink_pool,
+            'sink_grace_period': self._apply_sink_grace_period,
+            'discovery_window': self._apply_discovery_config,
+            'discovery_rssi_delta': self._apply_discovery_config,
+            'discovery_burst': self._apply_discovery_schedule,
+            'discovery_idle': self._apply_discovery_schedule,
+            'discovery_idle_max': self._apply_discovery_schedule,
+            'connect_timeout': self._apply_connect_timeout,
+            'pair_timeout': self._apply_pair_timeout,
+            'audio_sink_select': self._apply_attach_audio_sink,
+            'link_window': self._apply_link_config,
+            'link_rssi_threshold': self._apply_link_config,
+            'event_queue_size': self._apply_event_queue_size,
+            'change_feed_size': self._apply_change_feed_size,
+            'stats_interval': self._apply_stats_interval,
+        }
+
+    def _register_device(self, path, adapter_id=None):
+        entry = self.devices.entry_by_path(path)
+        if (entry is None):
+            # Snapshot all properties with a single GetProperties call;
+            # the snapshot is then patched from property changed signals.
+            # The BTDevice, whose constructor fetches the properties again,
+            # is only opened once it is needed
+            try:
+                with self.stats.timer('get_properties'):
+                    props = BTDeviceManager._get_device_properties(path)
+            except Exception as e:
+                logger.warning('BTDeviceManager unable to read properties '
+                               'path=%s: %s', path, e)
+                props = {}
+            entry = self.devices.add(path, None, props, adapter=adapter_id)
+            self.changes.record(entry.addr, CHANGE_ADDED, dict(props))
+            self._cache_device(entry)
+        return entry
+
+    @staticmethod
+    def _get_device_properties(path):
+        device = dbus.SystemBus().get_object(BLUEZ_SERVICE_NAME, path)
+        return dict(dbus.Interface(device, BLUEZ_DEVICE_INTERFACE).GetProperties())
+
+    @staticmethod
+    def _bt_device(entry):
+        if (entry.bt_device is None):
+            entry.bt_device = bt_manager.BTDevice(dev_path=entry.path)
+        return entry.bt_device
+
+    def _cache_device(self, entry):
+        if (self.cache is not None):
+            self.cache.update(entry.addr,
+                              name=entry.props.get('Name'),
+                              uuids=list(entry.props.get('UUIDs', [])),
+                              caps=list(BTDeviceManager._entry_to_device(entry)['caps']),
+                              adapter=entry.adapter,
+                              paired=bool(entry.props.get('Paired')))
+
+    def _reconcile_cache(self):
+        # Forget cached devices that bluetoothd no longer knows about
+        if (self.cache is not None):
+            self.cache.retain(set(entry.addr for entry in self.devices.entries()))
+
+    def _cached_device(self, addr):
+        record = self.cache and self.cache.get(addr)
+        if (record is not None):
+            return BTDeviceManager._make_device(record.get('name'), addr,
+                                                record.get('uuids', []))
+
+    def _unregister_device(self, path):
+        # Recorded here, as remove() unregisters a device before its
+        # DeviceRemoved signal arrives
+        entry = self.devices.remove(path)
+        if (entry is not None):
+            self.changes.record(entry.addr, CHANGE_REMOVED)
+        return entry
+
+    def _on_bus_property_changed(self, prop, value, path=None):
+        self._on_device_property_changed(bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED,
+                                         path, prop, value)
+
+    def _enumerate_devices(self, paths):
+        # Registers one device per main loop iteration so that start-up
+        # is not held up by the per-device property reads
+        try:
+            self._register_device(*next(paths))
+            return True
+        except StopIteration:
+            self.enumeration = None
+            self._reconcile_cache()
+            self._prewarm_sinks()
+            logger.info('BTDeviceManager device enumeration complete devices=%d',
+                        len(self.devices))
+            return False
+        except Exception as e:
+            logger.warning('BTDeviceManager device enumeration error: %s', e)
+            return True
+
+    @staticmethod
+    def _entry_to_device(entry):
+        return BTDeviceManager._make_device(entry.props.get('Name'),
+                                            entry.addr,
+                                            entry.props.get('UUIDs', []))
 
     def _on_device_created(self, signal_name, user_arg, path):
-        bt_device = bt_manager.BTDevice(dev_path=path)
-        dev = BTDeviceManager._make_device(bt_device.Name,
-                                           bt_device.Address,
-                                           bt_device.UUIDs)
-        service.ServiceListener.send('bluetooth_device_created',
-                                     service=self.name,
-                                     device=dev)
+        self.stats.signal(signal_name)
+        self._register_device(path, user_arg)
+        dev = BTDeviceManager._entry_to_device(self.devices.entry_by_path(path))
+        self.events.send('bluetooth_device_created',
+                         service=self.name,
+                         device=dev)
         logger.info('BTDeviceManager event=device_created dev=%s', dev)
 
     def _on_device_removed(self, signal_name, user_arg, path):
+        self.stats.signal(signal_name)
         # We can't access the device object from the dbus registry, since
         # it no longer exists.  We therefore have to translate the device
         # path to a device address
-        device_addr = path[-17:].replace('_', ':')
+        try:
+            self._unregister_device(path)
+        except:
+            pass
+        device_addr = path_to_address(path)
+        self.coalescer.forget(device_addr)
+        self.scheduler.forget(device_addr)
+        self.links.forget(device_addr)
+        self.sink_caps.pop(device_addr, None)
+        # A removed device won't be back, so its sink goes straight away
+        self.sink_lifecycle.lost(device_addr, grace=0)
+        if (self.cache is not None):
+            self.cache.remove(device_addr)
         dev = BTDeviceManager._make_device(None, device_addr, [])
-        service.ServiceListener.send('bluetooth_device_removed', service=self.name,
-                                     device=dev)
+        self.events.send('bluetooth_device_removed', service=self.name,
+                         device=dev)
         logger.info('BTDeviceManager event=device_removed dev=%s', dev)
 
     def _on_device_disappeared(self, signal_name, user_arg, device_addr):
+        self.stats.signal(signal_name)
+        self.coalescer.forget(device_addr)
+        # Connected devices can drop out of inquiry results while
+        # streaming, so only the sinks of unconnected devices are let go
+        props = self.devices.props_of(device_addr)
+        if (props is None or not props.get('Connected')):
+            self.sink_lifecycle.lost(device_addr)
         dev = BTDeviceManager._make_device(None, device_addr, [])
-        service.ServiceListener.send('bluetooth_device_disappeared',
-                                     service=self.name,
-                                     device=dev)
+        self.events.send('bluetooth_device_disappeared',
+                         service=self.name,
+                         device=dev)
         logger.info('BTDeviceManager event=device_disappeared dev=%s', dev)
 
     def _on_device_found(self, signal_name, user_arg, device_addr, device_info):
+        self.stats.signal(signal_name)
         # The device *MAY* not yet be in the dbus registry, so we use the
         # properties we get given in this signal handler to provide the
         # mandatory device fields
         uuids = device_info.get('UUIDs', [])
         name = device_info.get('Name')
+        rssi = device_info.get('RSSI')
+        if (self.sink_pool is not None):
+            self.sink_pool.touch(device_addr)
+        if (rssi is not None):
+            self.links.record_rssi(device_addr, rssi)
+            self._check_link(device_addr)
         dev = BTDeviceManager._make_device(name,
                                            device_addr,
                                            uuids)
-        service.ServiceListener.send('bluetooth_device_found',
-                                     service=self.name,
-                                     device=dev)
-        logger.info('BTDeviceManager event=device_found dev=%s', dev)
 
-        # Try to autoconnect if this is enabled
-        if (self.autoconnect):
-            self.connect(dev)
+        # Repeat inquiry results are only passed on to listeners when
+        # they are a first sighting or carry a real change
+        if (self.coalescer.offer(device_addr, name, uuids, rssi)):
+            self.events.send('bluetooth_device_found',
+                             service=self.name,
+                             device=dev)
+            logger.info('BTDeviceManager event=device_found dev=%s', dev)
 
-    def _on_device_property_changed(self, signal_name, path, prop, value):
+        # Try to autoconnect known devices if this is enabled, unless the
+        # device is already connected or a connection is already in progress
+        props = self.devices.props_of(device_addr)
+        if (self.autoconnect and props is not None):
+            if (self.connector.is_connecting(device_addr) or props.get('Connected')):
+                self.autoconnect_suppressed += 1
+            else:
+                self.scheduler.request(device_addr, props.get('Name', name))
+        elif (self.autoconnect and self.enumeration is not None):
+            # Devices not enumerated yet are known from the device cache
+            record = self.cache and self.cache.get(device_addr)
+            if (record is not None and record.get('paired')):
+                self.scheduler.request(device_addr, record.get('name'))
 
-        try:
-            bt_device = self.devices.get(path)
-            dev = BTDeviceManager._make_device(bt_device.Name,
-                                               bt_device.Address,
-                                               bt_device.UUIDs)
-        except:
-            device_addr = path[-17:].replace('_', ':')
+    def _on_device_property_changed(self, signal_name, path, prop, value):
+        self.stats.signal(signal_name)
+        entry = self.devices.update(path, prop, value)
+        if (entry is not None):
+            dev = BTDeviceManager._entry_to_device(entry)
+            self.changes.record(entry.addr, CHANGE_UPDATED, {prop: value})
+            if (prop in CACHED_PROPERTIES):
+                self._cache_device(entry)
+        else:
+            device_addr = path_to_address(path)
             dev = BTDeviceManager._make_device(None, device_addr, [])
         property_dict = {}
         property_dict[prop] = value
@@ -101,133 +331,481 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
 
         # We have dedicated events for the "Connected" property
         if (prop == 'Connected'):
+            self.connector.set_connected(dev['addr'], value)
             if (value):
                 if (self.config['attach_audio_sink'] and 'AudioSink' in dev['caps']):
-                    self._connect_audio_sink(dev['addr'])
-                service.ServiceListener.send('bluetooth_device_connected', service=self.name,
-                                             device=dev)
+                    self._attach_connected_sink(dev['addr'])
+                self.events.send('bluetooth_device_connected', service=self.name,
+                                 device=dev)
             else:
-                service.ServiceListener.send('bluetooth_device_disconnected', service=self.name,
-                                             device=dev)
+                self.events.send('bluetooth_device_disconnected', service=self.name,
+                                 device=dev)
+                # Drops that weren't asked for count against the link
+                if (not self.scheduler.is_held(dev['addr'])):
+                    self.links.record_drop(dev['addr'])
+                if (self.config['attach_audio_sink'] and
+                        self.config['audio_sink_select'] == 'strongest' and
+                        dev['addr'] in self._attached_audio_sinks()):
+                    self._disconnect_audio_sink(dev['addr'])
+                    self._handover_audio_sink()
+                else:
+                    self.sink_lifecycle.lost(dev['addr'])
+                # Look for other sinks straight away if this was the
+                # last one, and try to win the device back
+                if ('AudioSink' in dev['caps']):
+                    self.discovery.kick()
+                if (self.autoconnect and entry is not None):
+                    self.scheduler.request(dev['addr'], entry.props.get('Name'))
         else:
-            service.ServiceListener.send('bluetooth_device_property_changed', service=self.name,
-                                         device=dev,
-                                         property_dict=property_dict)
+            self.events.send('bluetooth_device_property_changed', service=self.name,
+                             device=dev,
+                             property_dict=property_dict)
 
-    @staticmethod
-    def _service_to_capability(service):
-        if (service.name == 'AudioSource'):
-            return service.name
-        elif (service.name == 'AudioSink'):
-            return service.name
-        elif (service.name == 'AVRemoteControl'):
-            return 'InputControl'
-        elif (service.name == 'HumanInterfaceDeviceService'):
-            return 'InputControl'
-        else:
-            return None
+    _service_to_capability = staticmethod(service_to_capability)
 
     @staticmethod
     def _make_device(name, addr, uuids):
-        capabilities = []
-        # Check for supported UUIDs and translate to respective capability
-        for i in uuids:
-            uuid = bt_manager.BTUUID(i)
-            service = bt_manager.SERVICES.get(uuid.uuid16)
-            if (service):
-                cap = BTDeviceManager._service_to_capability(service)
-                if (cap is not None):
-                    capabilities.append(cap)
-        return { 'addr': addr, 'caps': capabilities }
+        # Supported UUIDs are translated to their respective capabilities
+        # via the shared cache, which hands back an immutable tuple
+        return { 'addr': addr, 'caps': capability_cache.capabilities(uuids) }
 
     @staticmethod
     def _audio_sink_name(address):
         return BLUETOOTH_SERVICE_NAME + ':audio:' + address
 
+    def _sink_profile(self, address):
+        return self.sink_profiles.get(address.upper(), self.default_sink_profile)
+
+    def _load_sink_profiles(self):
+        # Values set at run time haven't been through the config schema,
+        # so bad ones are dropped here rather than when a sink is built
+        if (self.config['sink_profile'] in SINK_PROFILE_NAMES):
+            self.default_sink_profile = self.config['sink_profile']
+        else:
+            logger.warning('BTDeviceManager unknown sink_profile=%s, using default',
+                           self.config['sink_profile'])
+            self.default_sink_profile = 'default'
+        self.sink_profiles = {}
+        for i in self.config['sink_device_profiles'] or []:
+            try:
+                addr, profile = parse_sink_device_profile(i)
+            except ValueError as e:
+                logger.warning('BTDeviceManager ignoring sink_device_profiles '
+                               'entry: %s', e)
+                continue
+            self.sink_profiles[addr] = profile
+
+    @staticmethod
+    def _group_sink_name(key):
+        profile, caps = key
+        return '%s:audio:group:%s:%08x' % (BLUETOOTH_SERVICE_NAME, profile,
+                                           zlib.crc32(caps.encode('utf-8')) & 0xffffffff)
+
+    def _sink_caps(self, address):
+        # SBC capabilities are read once per device, as it takes an
+        # a2dpsink round trip
+        caps = self.sink_caps.get(address)
+        if (caps is None):
+            from .sink import query_sbc_caps
+            try:
+                caps = query_sbc_caps(address)
+            except Exception as e:
+                logger.warning('BTDeviceManager unable to read SBC capabilities '
+                               'dev=%s: %s', address, e)
+            if (caps is not None):
+                self.sink_caps[address] = caps
+        return caps
+
     def _connect_audio_sink(self, address):
-        self.core.add_audio_sink(BTDeviceManager._audio_sink_name(address),
-                                 BluetoothA2DPSink(address)) 
+        # GStreamer is only imported once a sink is actually needed
+        from .sink import BluetoothA2DPSink, BluetoothA2DPGroupSink
+        # A device back within the grace period keeps its sink
+        if (address in self._attached_audio_sinks()):
+            self.sink_lifecycle.attached(address)
+            return
+        with self.stats.timer('sink_attach'):
+            profile = self._sink_profile(address)
+            caps = None
+            if (self.config['audio_sink_mode'] == 'group'):
+                caps = self._sink_caps(address)
+                if (caps is None):
+                    logger.info('BTDeviceManager SBC capabilities of dev=%s unknown, '
+                                'using a sink of its own', address)
+            if (caps is not None):
+                # Devices sharing a profile and SBC capabilities share one
+                # encoder, with the device added to the group's output while
+                # it is playing
+                key = (profile, caps)
+                group = self.sink_groups.get(key)
+                if (group is None):
+                    group = BluetoothA2DPGroupSink(profile)
+                    group.on_stall = self._on_sink_stall
+                    group.add_member(address)
+                    self.sink_groups[key] = group
+                    self.core.add_audio_sink(BTDeviceManager._group_sink_name(key),
+                                             group)
+                else:
+                    group.add_member(address)
+            else:
+                if (self._sink_pool_enabled()):
+                    sink = self._get_sink_pool().acquire(address, profile)
+                else:
+                    sink = BluetoothA2DPSink(address, profile)
+                sink.on_stall = self._on_sink_stall
+                self.audio_sinks[address] = sink
+                self.core.add_audio_sink(BTDeviceManager._audio_sink_name(address),
+                                         sink)
+        self.sink_lifecycle.attached(address)
+
+    def _attached_audio_sinks(self):
+        attached = list(self.audio_sinks.keys())
+        for group in self.sink_groups.values():
+            attached.extend(group.members.keys())
+        return attached
+
+    def _attach_connected_sink(self, address):
+        if (self.config['audio_sink_select'] == 'strongest'):
+            self._handover_audio_sink()
+        else:
+            self._connect_audio_sink(address)
+
+    def _handover_audio_sink(self):
+        """
+        Keep the audio sink on a single connected device, moving it to the
+        device with the strongest link if its current device's link is
+        degrading or it has none
+        """
+        connected = self._connected_audio_sinks()
+        candidates = ([addr for addr in connected if not self.links.is_degrading(addr)] or
+                      connected)
+        if (not candidates):
+            return
+        attached = self._attached_audio_sinks()
+        if (attached and attached[0] in candidates):
+            return
+        best = min(candidates, key=self.links.sort_key)
+        if (best in attached):
+            return
+        logger.info('BTDeviceManager handing audio sink over from dev=%s to dev=%s',
+                    attached[0] if attached else None, best)
+        # Attach the new sink first so that playback carries on
+        self._connect_audio_sink(best)
+        for address in attached:
+            self._disconnect_audio_sink(address)
+
+    def _check_link(self, address):
+        if (self.config['attach_audio_sink'] and
+                self.config['audio_sink_select'] == 'strongest' and
+                address in self._attached_audio_sinks() and
+                self.links.is_degrading(address)):
+            logger.info('BTDeviceManager link to dev=%s is degrading', address)
+            self._handover_audio_sink()
+
+    def _on_sink_stall(self, address):
+        self.links.record_stall(address)
+        self._check_link(address)
+
+    def _expire_audio_sink(self, address):
+        # Keep the sink if the device has come back in the meantime
+        props = self.devices.props_of(address)
+        if (props is None or not props.get('Connected')):
+            self._disconnect_audio_sink(address)
+        else:
+            self.sink_lifecycle.attached(address)
+
+    def _get_sink_stats(self):
+        stats = self.sink_lifecycle.stats()
+        buffered = dict((address, sink.buffered_bytes())
+                        for address, sink in self.audio_sinks.items())
+        stalled = []
+        for key, group in self.sink_groups.items():
+            buffered[BTDeviceManager._group_sink_name(key)] = group.buffered_bytes()
+            stalled.extend(group.stalled())
+        stats['buffered'] = buffered
+        stats['stalled'] = sorted(stalled)
+        stats['buffered_bytes'] = sum(buffered.values())
+        return stats
 
     def _disconnect_audio_sink(self, address):
+        self.sink_lifecycle.detached(address)
+        for key, group in list(self.sink_groups.items()):
+            if (address in group.members):
+                group.remove_member(address)
+                if (not group.members):
+                    del self.sink_groups[key]
+                    self.core.remove_audio_sink(BTDeviceManager._group_sink_name(key))
+                    group.close()
+                return
         self.core.remove_audio_sink(BTDeviceManager._audio_sink_name(address))
+        sink = self.audio_sinks.pop(address, None)
+        if (sink is not None):
+            sink.on_stall = None
+            if (self._sink_pool_enabled()):
+                self._get_sink_pool().release(address, sink)
+            else:
+                sink.close()
+
+    def _sink_pool_enabled(self):
+        return (self.config['attach_audio_sink'] and
+                self.config['audio_sink_mode'] == 'single' and
+                self.config['sink_pool_size'] > 0)
+
+    def _get_sink_pool(self):
+        if (self.sink_pool is None):
+            from .sink import SinkPool
+            self.sink_pool = SinkPool()
+        self.sink_pool.size = self.config['sink_pool_size']
+        self.sink_pool.max_age = self.config['sink_pool_max_age']
+        return self.sink_pool
+
+    def _get_sink_pool_stats(self):
+        if (self.sink_pool is None):
+            return {'size': 0, 'devices': []}
+        return self.sink_pool.stats()
+
+    def _prewarm_sinks(self):
+        # Build sinks for paired audio sink devices that are not yet
+        # connected, so that they start playing sooner once they are
+        if (self._sink_pool_enabled()):
+            pool = self._get_sink_pool()
+            for entry in self.devices.entries():
+                if (entry.props.get('Paired') and not entry.props.get('Connected') and
+                        'AudioSink' in BTDeviceManager._entry_to_device(entry)['caps']):
+                    pool.prewarm(entry.addr, self._sink_profile(entry.addr))
+        return False
 
-    def _on_device_created_ok(self, path):
+    def _autoconnect_device(self, address):
+        return self._connect({'addr': address})
+
+    def _on_connect_complete(self, attempt):
+        self.scheduler.completed(attempt.addr, attempt.state != STATE_FAILED)
+        self.stats.connect_result(attempt.addr, attempt.state != STATE_FAILED,
+                                  attempt.elapsed)
+        if (self.cache is not None and attempt.addr in self.cache.records):
+            self.cache.update(attempt.addr,
+                              last_outcome=attempt.state,
+                              last_connect=attempt.finished,
+                              connect_time=attempt.elapsed)
+        dev = BTDeviceManager._make_device(None, attempt.addr, [])
+        if (attempt.state == STATE_FAILED):
+            self.events.send('bluetooth_device_connect_failed',
+                             service=self.name,
+                             device=dev)
+            logger.warning('BTDeviceManager event=device_connect_failed dev=%s '
+                           'elapsed=%.2fs', dev, attempt.elapsed)
+        else:
+            logger.info('BTDeviceManager dev=%s profiles=%s connected in %.2fs',
+                        dev, attempt.connected, attempt.elapsed)
+
+    def _get_discovery_duty_cycle(self):
+        return self.discovery.duty_cycle
+
+    def _get_discovery_stats(self):
+        stats = self.coalescer.stats()
+        stats['autoconnect_suppressed'] = self.autoconnect_suppressed
+        return stats
+
+    def _on_device_created_ok(self, path, adapter_id=None, started=None):
         logger.info('BTDeviceManager device=%s created ok', path)
-        bt_device = bt_manager.BTDevice(dev_path=path)
-        bt_device.discover_services()
-        bt_device.add_signal_receiver(self._on_device_property_changed,
-                                      bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED,
-                                      path)
+        self.pairings.complete(path_to_address(path))
+        if (started is not None):
+            self.stats.observe('create_paired_device', time.time() - started)
+        bt_device = BTDeviceManager._bt_device(self._register_device(path, adapter_id))
+        with self.stats.timer('discover_services'):
+            bt_device.discover_services()
         bt_device.Trusted = True
-        self.devices[str(path)] = bt_device
 
-    def _on_device_created_error(self, error):
+    def _on_device_created_error(self, error, addr=None, started=None):
         logger.error('BTDeviceManager device creation error: %s', error)
+        self.pairings.complete(addr, success=False)
+        self.stats.count('create_paired_device_error')
+        if (started is not None):
+            self.stats.observe('create_paired_device', time.time() - started)
 
     def _on_request_confirmation(self, event, path, pass_key):
-        device_addr = path[-17:].replace('_', ':')
+        device_addr = path_to_address(path)
         dev = BTDeviceManager._make_device(None, device_addr, [])
-        service.ServiceListener.send('bluetooth_pass_key_confirmation',
-                                     service=self.name,
-                                     device=dev,
-                                     pass_key=pass_key)
+        self.events.send('bluetooth_pass_key_confirmation',
+                         service=self.name,
+                         device=dev,
+                         pass_key=pass_key)
         logger.info('BTDeviceManager event=device_pass_key_confirmation dev=%s', dev)
         return dbus.UInt32(pass_key)
 
     def _on_request_pin_code(self, event, path):
-        pin_code = self.config['pincode']
-        device_addr = path[-17:].replace('_', ':')
+        device_addr = path_to_address(path)
+        # Use the PIN code given when pairing the device, if any
+        pairing = self.pairings.get(device_addr)
+        if (pairing is not None and pairing.pincode is not None):
+            pin_code = pairing.pincode
+        else:
+            pin_code = self.config['pincode']
         dev = BTDeviceManager._make_device(None, device_addr, [])
-        service.ServiceListener.send('bluetooth_pin_code_requested',
-                                     device=dev,
-                                     pin_code=pin_code)
+        self.events.send('bluetooth_pin_code_requested',
+                         device=dev,
+                         pin_code=pin_code)
         logger.info('BTDeviceManager event=device_pin_code_requested dev=%s', dev)
         return dbus.String(pin_code)
 
     def _on_release(self):
         logger.info('BTDeviceManager agent released')
 
-    @private_method
-    def on_start(self):
-        """
-        Activate the BT adapter
-        """
-        adapter = bt_manager.BTAdapter()
-        self.is_powered_on_start = adapter.Powered
+    def _on_pairing_timeout(self, pairing):
+        logger.warning('BTDeviceManager pairing dev=%s timed out', pairing.addr)
+        self.stats.count('pair_timeout')
+        state = self._adapter_state(pairing.adapter_id)
+        if (state is not None):
+            try:
+                state.adapter._interface.CancelDeviceCreation(pairing.addr)
+            except Exception as e:
+                logger.warning('BTDeviceManager unable to cancel pairing dev=%s: %s',
+                               pairing.addr, e)
+
+    def _start_adapter(self, adapter_id):
+        if (adapter_id == DEFAULT_ADAPTER_ID):
+            adapter = bt_manager.BTAdapter()
+        else:
+            adapter = bt_manager.BTAdapter(adapter_id=adapter_id)
+        state = AdapterState(adapter_id, adapter, adapter.Powered)
         adapter.Powered = True
         adapter.Name = self.config['name']
 
+        # Adapter signals carry the adapter identifier as their user
+        # argument so that devices can be tied to the adapter owning them
         adapter.add_signal_receiver(self._on_device_created,
                                     bt_manager.BTAdapter.SIGNAL_DEVICE_CREATED,
-                                    None)
+                                    adapter_id)
         adapter.add_signal_receiver(self._on_device_removed,
                                     bt_manager.BTAdapter.SIGNAL_DEVICE_REMOVED,
-                                    None)
+                                    adapter_id)
         adapter.add_signal_receiver(self._on_device_disappeared,
                                     bt_manager.BTAdapter.SIGNAL_DEVICE_DISAPPEARED,
-                                    None)
+                                    adapter_id)
         adapter.add_signal_receiver(self._on_device_found,
                                     bt_manager.BTAdapter.SIGNAL_DEVICE_FOUND,
-                                    None)
+                                    adapter_id)
+
+        # Register as the adapter's default agent, for pairings started
+        # from either side
+        try:
+            adapter.register_agent(AGENT_PATH, AGENT_CAPABILITY)
+        except Exception as e:
+            logger.warning('BTDeviceManager unable to register agent adapter=%s: %s',
+                           adapter_id, e)
+        return state
+
+    def _stop_adapter(self, state):
+        adapter = state.adapter
+
+        # Remove adapter events
+        adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED)
+        adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_FOUND)
+        adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_DISAPPEARED)
+        adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_REMOVED)
+        adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_CREATED)
+        try:
+            adapter.unregister_agent(AGENT_PATH)
+        except Exception as e:
+            logger.warning('BTDeviceManager unable to unregister agent adapter=%s: %s',
+                           state.id, e)
+
+        # Restore initial power-up state
+        adapter.Powered = state.powered_on_start
+
+    def _start_discovery(self):
+        with self.stats.timer('start_discovery'):
+            for state in self.adapters:
+                state.adapter.start_discovery()
+
+    def _stop_discovery(self):
+        with self.stats.timer('stop_discovery'):
+            for state in self.adapters:
+                state.adapter.stop_discovery()
 
-        # Obtain initial list of devices and register for signal events
-        bt_devices = adapter.list_devices()
-        for i in bt_devices:
-            bt_device = bt_manager.BTDevice(dev_path=i)
-            bt_device.add_signal_receiver(self._on_device_property_changed,
-                                          bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED,
-                                          i)
-            self.devices[str(i)] = bt_device
+    def _is_streaming(self):
+        return len(self._connected_audio_sinks()) > 0
 
-        # Enable device discovery
-        adapter.start_discovery()
+    def _adapter_state(self, adapter_id):
+        for state in self.adapters:
+            if (state.id == adapter_id):
+                return state
 
-        # Store away adapter for future usage
-        self.adapter = adapter
+    def _device_adapter(self, addr):
+        # The adapter owning a known device, else the least loaded one
+        entry = self.devices.entry(addr)
+        state = None
+        if (entry is not None):
+            state = self._adapter_state(entry.adapter)
+        if (state is None):
+            state = least_loaded(self.adapters, self.devices)
+        return state
+
+    @private_method
+    def on_start(self):
+        """
+        Activate the BT adapters
+        """
+        # Devices from the last run are known straight away, until the
+        # device cache is reconciled with the adapters' devices
+        if (self.config['cache_file']):
+            self.cache = DeviceCache(self.config['cache_file'])
+            self.cache.load()
+        else:
+            self.cache = None
+        self._apply_event_queue_size()
+        self._apply_change_feed_size()
+        self._apply_stats_interval()
+        self._apply_pair_timeout()
+        self._apply_link_config()
+        self._apply_sink_grace_period()
+        self.events.start()
+
+        # One agent serves every pairing, on every adapter
+        self.agent = bt_manager.BTAgent(path=AGENT_PATH,
+                                        cb_notify_on_request_pin_code=self._on_request_pin_code,
+                                        cb_notify_on_request_confirmation=self._on_request_confirmation,
+                                        cb_notify_on_release=self._on_release)
+        adapter_ids = list(self.config['adapters'] or [DEFAULT_ADAPTER_ID])
+        self.adapters = [self._start_adapter(i) for i in adapter_ids]
+
+        self._apply_discovery_config()
+        self.coalescer.clear()
+        self._apply_connect_timeout()
+        self._apply_scheduler_config()
+
+        # A single match rule delivers property changes for every device
+        dbus.SystemBus().add_signal_receiver(self._on_bus_property_changed,
+                                             bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED,
+                                             BLUEZ_DEVICE_INTERFACE,
+                                             BLUEZ_SERVICE_NAME,
+                                             path_keyword='path')
+
+        # Obtain initial list of devices, either now or, in fast start
+        # mode, in the background once the service has started
+        bt_devices = [(path, state.id) for state in self.adapters
+                      for path in state.adapter.list_devices()]
+        if (self.config['fast_start']):
+            self.enumeration = gobject.idle_add(self._enumerate_devices,
+                                                iter(bt_devices))
+        else:
+            for path, adapter_id in bt_devices:
+                self._register_device(path, adapter_id)
+            self._reconcile_cache()
+
+        # Enable device discovery on every adapter
+        self._apply_discovery_schedule()
+        self.discovery.start()
+
+        # Store away the primary adapter for future usage
+        self.adapter = self.adapters[0].adapter
+
+        self._apply_autoconnect()
+        if (self._sink_pool_enabled() and self.enumeration is None):
+            gobject.idle_add(self._prewarm_sinks)
 
         # Notify listeners
         self.state = service.ServiceState.SERVICE_STATE_STARTED
-        service.ServiceListener.send('service_started', service=self.name)
+        self.events.send('service_started', service=self.name)
         logger.info('BTDeviceManager started')
 
     @private_method
@@ -237,27 +815,46 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         """
 
         # Cleanup device events
-        for i in self.devices.keys():
-            d = self.devices.pop(i)
-            d.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED)
-
-        # Stop discovery
-        self.adapter.stop_discovery()
-
-        # Remove adapter events
-        self.adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED)
-        self.adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_FOUND)
-        self.adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_DISAPPEARED)
-        self.adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_REMOVED)
-        self.adapter.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_DEVICE_CREATED)
+        if (self.enumeration is not None):
+            gobject.source_remove(self.enumeration)
+            self.enumeration = None
+        dbus.SystemBus().remove_signal_receiver(self._on_bus_property_changed,
+                                                bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED,
+                                                BLUEZ_DEVICE_INTERFACE,
+                                                BLUEZ_SERVICE_NAME,
+                                                path_keyword='path')
+        # Take every audio sink out of the audio output
+        for address in self._attached_audio_sinks():
+            self._disconnect_audio_sink(address)
+        self.sink_lifecycle.clear()
+        self.sink_caps.clear()
+        self.devices.clear()
+        self.changes.reset()
+        if (self.sink_pool is not None):
+            self.sink_pool.clear()
+        if (self.cache is not None):
+            self.cache.flush()
 
-        # Restore initial power-up state
-        self.adapter.Powered = self.is_powered_on_start
+        # Stop any pending autoconnects, then discovery on each adapter
+        self.scheduler.stop()
+        self.discovery.stop()
+        for state in self.adapters:
+            self._stop_adapter(state)
+        self.adapters = []
         self.adapter = None
+        self.pairings.clear()
+        if (self.agent is not None):
+            try:
+                self.agent.remove_from_connection()
+            except Exception as e:
+                logger.warning('BTDeviceManager unable to remove agent: %s', e)
+            self.agent = None
 
         # Notify listeners
         self.state = service.ServiceState.SERVICE_STATE_STOPPED
-        service.ServiceListener.send('service_stopped', service=self.name)
+        self.events.send('service_stopped', service=self.name)
+        self.events.stop()
+        self.stats.stop_logging()
         logger.info('BTDeviceManager stopped')
 
     @private_method
@@ -268,14 +865,112 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
     def stop(self, *args, **kwargs):
         return pykka.ThreadingActor.stop(self, *args, **kwargs)
 
+    def _apply_name(self, value=None):
+        for state in self.adapters:
+            state.adapter.Name = self.config['name']
+
+    def _apply_pincode(self, value=None):
+        # The pin code is read from the config on each agent request, so
+        # the registered agent picks up the new value as it is
+        pass
+
+    def _apply_autoconnect(self, value=None):
+        self.autoconnect = self.config['autoconnect']
+        if (self.autoconnect):
+            self.scheduler.start()
+        else:
+            self.scheduler.stop()
+
+    def _apply_scheduler_config(self, value=None):
+        self.scheduler.priority = list(self.config['autoconnect_priority'] or [])
+        self.scheduler.concurrency = self.config['autoconnect_concurrency']
+        self.scheduler.backoff = self.config['autoconnect_backoff']
+        self.scheduler.backoff_max = self.config['autoconnect_backoff_max']
+
+    def _connected_audio_sinks(self):
+        return [entry.addr for entry in self.devices.entries()
+                if entry.props.get('Connected') and
+                'AudioSink' in BTDeviceManager._entry_to_device(entry)['caps']]
+
+    def _apply_attach_audio_sink(self, value=None):
+        attached = self._attached_audio_sinks()
+        if (not self.config['attach_audio_sink']):
+            for address in attached:
+                self._disconnect_audio_sink(address)
+        elif (self.config['audio_sink_select'] == 'strongest'):
+            # Keep the best placed sink only
+            for address in attached[1:]:
+                self._disconnect_audio_sink(address)
+            self._handover_audio_sink()
+        else:
+            for address in self._connected_audio_sinks():
+                if (address not in attached):
+                    self._connect_audio_sink(address)
+
+    def _apply_sink_profile(self, value=None):
+        self._load_sink_profiles()
+        # Rebuild attached sinks so that they pick up their new profile
+        for address in self._attached_audio_sinks():
+            self._disconnect_audio_sink(address)
+            self._connect_audio_sink(address)
+
+    def _apply_sink_grace_period(self, value=None):
+        self.sink_lifecycle.grace = self.config['sink_grace_period']
+
+    def _apply_link_config(self, value=None):
+        self.links.window = self.config['link_window']
+        self.links.rssi_threshold = self.config['link_rssi_threshold']
+
+    def _apply_sink_pool(self, value=None):
+        if (self.sink_pool is not None):
+            if (self._sink_pool_enabled()):
+                self._get_sink_pool().trim()
+            else:
+                self.sink_pool.clear()
+        self._prewarm_sinks()
+
+    def _apply_discovery_config(self, value=None):
+        self.coalescer.window = self.config['discovery_window']
+        self.coalescer.rssi_delta = self.config['discovery_rssi_delta']
+
+    def _apply_discovery_schedule(self, value=None):
+        self.discovery.burst = self.config['discovery_burst']
+        self.discovery.idle = self.config['discovery_idle']
+        self.discovery.idle_max = self.config['discovery_idle_max']
+        self.discovery.restart()
+
+    def _apply_connect_timeout(self, value=None):
+        self.connector.timeout = self.config['connect_timeout']
+
+    def _apply_pair_timeout(self, value=None):
+        self.pairings.timeout = self.config['pair_timeout']
+
+    def _apply_event_queue_size(self, value=None):
+        self.events.max_size = self.config['event_queue_size']
+
+    def _apply_stats_interval(self, value=None):
+        self.stats.start_logging(self.config['stats_interval'])
+
+    def _apply_change_feed_size(self, value=None):
+        if (self.changes.max_size != self.config['change_feed_size']):
+            self.changes.max_size = self.config['change_feed_size']
+
     def set_property(self, name, value):
         if (name in self.config):
             self.config[name] = value
-            service.ServiceListener.send('service_property_changed',
-                                         service=self.name,
-                                         props={ name: value })
-            self.on_stop()
-            self.on_start()
+            self.events.send('service_property_changed',
+                             service=self.name,
+                             props={ name: value })
+            # Apply the change in place where possible, otherwise fall
+            # back to restarting the device manager
+            if (self.adapter is None):
+                return
+            handler = self.property_handlers.get(name)
+            if (handler is not None):
+                handler(value)
+            else:
+                self.on_stop()
+                self.on_start()
 
     def get_property(self, name):
         if (name is None):
@@ -284,20 +979,95 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
             try:
                 value = self.config[name]
                 return { name: value }
+            except:
+                pass
+            try:
+                value = self.status_properties[name]()
+                return { name: value }
             except:
                 return None
 
-    def get_devices(self):
+    def get_adapters(self):
+        """
+        Get the managed adapters with their connected and known device counts
+        """
+        adapters = []
+        for state in self.adapters:
+            entries = self.devices.entries(state.id)
+            adapters.append({'id': state.id,
+                             'devices': [entry.addr for entry in entries],
+                             'connected': len([entry for entry in entries
+                                               if entry.props.get('Connected')])})
+        return adapters
+
+    def get_devices(self, properties=None, filter=None):
+        """
+        Get the known devices.
+
+        ``filter`` may restrict the devices returned with a list of
+        required ``caps`` and with ``connected`` and ``paired`` flags.  If
+        a list of ``properties`` is given, each device also carries those
+        of its properties that are set, under ``properties``.
+        """
         devices = []
-        for dev in self.devices.values():
-            try:
-                devices.append(BTDeviceManager._make_device(dev.Name,
-                                                            dev.Address,
-                                                            dev.UUIDs))
-            except:
-                pass
+        for entry in self.devices.entries():
+            dev = BTDeviceManager._entry_to_device(entry)
+            if (BTDeviceManager._device_matches(dev, entry.props, filter)):
+                devices.append(BTDeviceManager._project(dev, entry.props, properties))
+        # Include cached devices that have not been enumerated yet
+        if (self.cache is not None and self.enumeration is not None):
+            for addr, record in self.cache.records.items():
+                if (addr in self.devices):
+                    continue
+                dev = self._cached_device(addr)
+                props = {'Name': record.get('name'),
+                         'UUIDs': record.get('uuids', []),
+                         'Paired': record.get('paired', False)}
+                if (BTDeviceManager._device_matches(dev, props, filter)):
+                    devices.append(BTDeviceManager._project(dev, props, properties))
         return devices
 
+    @staticmethod
+    def _device_matches(dev, props, filter):
+        if (not filter):
+            return True
+        caps = filter.get('caps')
+        if (caps and not set(caps).issubset(dev['caps'])):
+            return False
+        for key, name in (('connected', 'Connected'), ('paired', 'Paired')):
+            if (key in filter and bool(props.get(name)) != bool(filter[key])):
+                return False
+        return True
+
+    @staticmethod
+    def _project(dev, props, properties):
+        if (properties is None):
+            return dev
+        return dict(dev, properties=dict((name, props[name]) for name in properties
+                                         if name in props))
+
+    def get_changes(self, since_version=0):
+        """
+        Get the device changes since a version returned by an earlier call.
+
+        The result holds the current ``version`` and either a list of
+        ``changes``, each with the ``version``, ``addr``, kind of ``change``
+        and changed ``properties``, or a ``snapshot`` of every device's
+        properties if the changes since ``since_version`` are not all held
+        """
+        return self.changes.since(since_version, self._get_device_snapshot)
+
+    def get_stats(self):
+        """
+        Get counters and latency histograms for bluetooth signals, D-Bus
+        calls, device connections and audio sink attachment
+        """
+        return self.stats.snapshot()
+
+    def _get_device_snapshot(self):
+        return [{'addr': entry.addr, 'properties': dict(entry.props)}
+                for entry in self.devices.entries()]
+
     def enable(self):
         """
         Enable the device manager
@@ -318,63 +1088,159 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         """
         Connect device's compatible profiles
         """
+        self.scheduler.release(normalize_address(dev['addr']))
+        return self._connect(dev)
+
+    def _connect(self, dev):
         logger.info('BTDeviceManager connecting dev=%s', dev)
-        try:
-            path = str(self.adapter.find_device(dev['addr']))
-            bt_device = self.devices.get(path)
-            if (bt_device is not None):
-                dev = BTDeviceManager._make_device(bt_device.Name,
-                                                   bt_device.Address,
-                                                   bt_device.UUIDs)
-                if ('AudioSink' in dev['caps']):
-                    sink = bt_manager.BTAudioSink(dev_id=dev['addr'])
-                    sink.connect()
-                if ('AudioSource' in dev['caps']):
-                    source = bt_manager.BTAudioSource(dev_id=dev['addr'])
-                    source.connect()
-                if ('InputControl' in dev['caps']):
-                    ip = bt_manager.BTInput(dev_id=dev['addr'])
-                    ip.connect()
-        except:
-            pass
+        addr = normalize_address(dev['addr'])
+        entry = self.devices.entry(addr)
+        if (entry is not None):
+            dev = BTDeviceManager._entry_to_device(entry)
+            kwargs = {'dev_path': entry.path}
+        else:
+            # Devices that are only known from the device cache are
+            # looked up by address instead
+            dev = self._cached_device(addr)
+            kwargs = {'dev_id': addr}
+        if (dev is None):
+            logger.warning('BTDeviceManager unable to connect unknown dev=%s', addr)
+            return STATE_FAILED
+        if (self.connector.is_connecting(addr)):
+            return self.connector.state(addr)
+        with self.stats.timer('connect'):
+            # A profile object can't be opened if bluetoothd doesn't offer
+            # its interface for the device, e.g. org.bluez.Input for a
+            # speaker with AVRCP, so each is tried on its own
+            profiles = []
+            for cap, class_name in PROFILE_CLASSES:
+                if (cap not in dev['caps']):
+                    continue
+                try:
+                    profiles.append((cap, getattr(bt_manager, class_name)(**kwargs)))
+                except Exception as e:
+                    logger.warning('BTDeviceManager skipping profile=%s dev=%s: %s',
+                                   cap, dev, e)
+            if (not profiles):
+                logger.error('BTDeviceManager unable to connect dev=%s: '
+                             'no profile available', dev)
+                return STATE_FAILED
+            return self.connector.connect(addr, profiles).state
+
+    def get_connection_state(self, dev):
+        """
+        Get the progress of a device's most recent connection attempt
+        """
+        addr = normalize_address(dev['addr'])
+        attempt = self.connector.attempt(addr)
+        if (attempt is None):
+            return {'addr': addr, 'state': self.connector.state(addr)}
+        return attempt.to_dict()
+
+    def connect_many(self, devs, timeout=None):
+        """
+        Connect several devices at the same time.
+
+        Returns the connection state of each device by address.  If a
+        ``timeout`` is given, waits up to that many seconds in all for the
+        connection attempts to complete and returns their final states.
+        """
+        results = dict((dev['addr'], self.connect(dev)) for dev in devs)
+        if (timeout is not None):
+            deadline = time.time() + timeout
+            for addr, state in results.items():
+                if (state == STATE_CONNECTING):
+                    results[addr] = self.connector.wait(normalize_address(addr),
+                                                        max(0, deadline - time.time()))
+        return results
 
     def disconnect(self, dev):
         """
         Disconnect a device
         """
-        logger.info('BTDeviceManager disconnecting dev=%s', dev)
         try:
-            if (self.config['attach_audio_sink']):
-                self._disconnect_audio_sink(dev['addr'])
-            bt_device = bt_manager.BTDevice(dev_id=dev['addr'])
-            bt_device.disconnect()
+            self._prepare_disconnect(dev).disconnect()
+            return True
         except:
-            pass
+            return False
+
+    def _prepare_disconnect(self, dev):
+        logger.info('BTDeviceManager disconnecting dev=%s', dev)
+        addr = normalize_address(dev['addr'])
+        self.scheduler.hold(addr)
+        if (self.config['attach_audio_sink']):
+            self._disconnect_audio_sink(addr)
+        entry = self.devices.entry(addr)
+        if (entry is not None):
+            return BTDeviceManager._bt_device(entry)
+        return bt_manager.BTDevice(dev_id=addr)
 
-    def pair(self, dev):
+    def disconnect_many(self, devs, timeout=None):
         """
-        Pair a device
+        Disconnect several devices at the same time.
+
+        Each disconnect is issued as an asynchronous D-Bus call.  Returns
+        whether each device was disconnected by address, or None for those
+        whose disconnect is still in progress.  If a ``timeout`` is given,
+        waits up to that many seconds in all for the disconnects to
+        complete.
         """
-        if (not self.is_paired(dev)):
-            logger.info('BTDeviceManager pairing dev=%s', dev)
-            path = '/mopidy/agent'
-            # Register agent for handling device pairing/authentication
+        results = {}
+        done = {}
+        for dev in devs:
+            addr = dev['addr']
+            results[addr] = None
+            done[addr] = threading.Event()
             try:
-                self.agent.remove_from_connection()
-                self.adapter.unregister_agent(path)
-            except:
-                pass
+                bt_device = self._prepare_disconnect(dev)
+                bt_device._interface.Disconnect(
+                    reply_handler=functools.partial(self._on_disconnect_reply,
+                                                    results, done[addr], addr, None),
+                    error_handler=functools.partial(self._on_disconnect_reply,
+                                                    results, done[addr], addr),
+                    timeout=self.connector.timeout)
+            except Exception as e:
+                self._on_disconnect_reply(results, done[addr], addr, e)
+        if (timeout is not None):
+            deadline = time.time() + timeout
+            for event in done.values():
+                event.wait(max(0, deadline - time.time()))
+        return dict(results)
 
+    @staticmethod
+    def _on_disconnect_reply(results, event, addr, error, *args):
+        if (error is not None):
+            logger.warning('BTDeviceManager disconnect dev=%s failed: %s',
+                           addr, error)
+        results[addr] = error is None
+        event.set()
+
+    def pair(self, dev, pincode=None, timeout=None):
+        """
+        Pair a device, optionally with its own PIN code and a timeout in
+        seconds other than ``pair_timeout``
+        """
+        addr = normalize_address(dev['addr'])
+        if (addr in self.pairings):
+            logger.info('BTDeviceManager dev=%s already pairing', dev)
+        elif (not self.is_paired(dev)):
+            logger.info('BTDeviceManager pairing dev=%s', dev)
+            # New devices are paired with the least loaded adapter
+            state = least_loaded(self.adapters, self.devices)
+            if (state is None):
+                raise exceptions.ExtensionError('Unable to create paired device')
+            self.pairings.add(addr, pincode, state.id, timeout)
             try:
-                self.agent = bt_manager.BTAgent(path=path,
-                                                cb_notify_on_request_pin_code=self._on_request_pin_code,
-                                                cb_notify_on_request_confirmation=self._on_request_confirmation,
-                                                cb_notify_on_release=self._on_release)
-                caps = 'DisplayYesNo'
-                self.adapter.create_paired_device(dev['addr'], path, caps,
-                                                  self._on_device_created_ok,
-                                                  self._on_device_created_error)
+                started = time.time()
+                state.adapter.create_paired_device(addr, AGENT_PATH, AGENT_CAPABILITY,
+                                                   functools.partial(self._on_device_created_ok,
+                                                                     adapter_id=state.id,
+                                                                     started=started),
+                                                   functools.partial(self._on_device_created_error,
+                                                                     addr=addr,
+                                                                     started=started))
             except:
+                self.pairings.remove(addr)
                 raise exceptions.ExtensionError('Unable to create paired device')
         else:
             logger.info('BTDeviceManager dev=%s already paired', dev)
@@ -385,11 +1251,11 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         """
         logger.info('BTDeviceManager removing dev=%s', dev)
         try:
-            path = str(self.adapter.find_device(dev['addr']))
-            if (path in self.devices):
-                bt_device = self.devices.pop(path)
-                bt_device.remove_signal_receiver(bt_manager.BTAdapter.SIGNAL_PROPERTY_CHANGED)
-                self.adapter.remove_device(path)
+            entry = self.devices.entry(dev['addr'])
+            if (entry is not None):
+                state = self._device_adapter(entry.addr)
+                self._unregister_device(entry.path)
+                state.adapter.remove_device(entry.path)
         except:
             raise
 
@@ -398,9 +1264,8 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         Ascertain if a device is connected
         """
         try:
-            path = str(self.adapter.find_device(dev['addr']))
-            bt_device = self.devices.get(path)
-            if (bt_device.Connected):
+            props = self.devices.props_of(dev['addr'])
+            if (props['Connected']):
                 return True
             else:
                 return False
@@ -412,9 +1277,8 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         Ascertain if a device is paired
         """
         try:
-            path = str(self.adapter.find_device(dev['addr']))
-            bt_device = self.devices.get(path)
-            if (bt_device.Paired):
+            props = self.devices.props_of(dev['addr'])
+            if (props['Paired']):
                 return True
             else:
                 return False
@@ -426,9 +1290,9 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         Set a device's property
         """
         try:
-            path = str(self.adapter.find_device(dev['addr']))
-            bt_device = self.devices.get(path)
-            bt_device.set_property(name, value)
+            bt_device = BTDeviceManager._bt_device(self.devices.entry(dev['addr']))
+            with self.stats.timer('set_device_property'):
+                bt_device.set_property(name, value)
         except:
             pass
 
@@ -437,9 +1301,10 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         Get a device's property
         """
         try:
-            path = str(self.adapter.find_device(dev['addr']))
-            bt_device = self.devices.get(path)
-            return bt_device.get_property(name)
+            props = self.devices.props_of(dev['addr'])
+            if (name is None):
+                return dict(props)
+            return props[name]
         except:
             pass
 
@@ -448,9 +1313,8 @@ class BTDeviceManager(pykka.ThreadingActor, service.Service):
         Check if a device has a particular property name
         """
         try:
-            path = str(self.adapter.find_device(dev['addr']))
-            bt_device = self.devices.get(path)
-            if (bt_device):
-                return name in bt_device.__dict__
+            props = self.devices.props_of(dev['addr'])
+            if (props is not None):
+                return name in props
         except:
             pass
@@ -0,0 +1,40 @@
+from __future__ import unicode_literals
+
+DEFAULT_ADAPTER_ID = 'default'
+
+
+class AdapterState(object):
+    """
+    A bluetooth adapter under management, with the power state it had
+    before it was taken over so that it can be restored on stop
+    """
+    __slots__ = ('id', 'adapter', 'powered_on_start')
+
+    def __init__(self, id, adapter, powered_on_start):
+        self.id = id
+        self.adapter = adapter
+        self.powered_on_start = powered_on_start
+
+
+def adapter_load(registry, adapter_id):
+    """
+    Load of an adapter as a (connected devices, known devices) tuple
+    """
+    entries = registry.entries(adapter_id)
+    connected = len([entry for entry in entries if entry.props.get('Connected')])
+    return (connected, len(entries))
+
+
+def least_loaded(states, registry):
+    """
+    Pick the adapter with the fewest connected devices, then the fewest
+    known devices, preferring adapters earlier in configuration order
+    """
+    best = None
+    best_load = None
+    for state in states:
+        load = adapter_load(registry, state.id)
+        if (best is None or load < best_load):
+            best = state
+            best_load = load
+    return best
@@ -0,0 +1,99 @@
+from __future__ import unicode_literals
+
+import json
+import logging
+import os
+import tempfile
+
+import gobject
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class DeviceCache(object):
+    """
+    Persistent, on-disk record of known devices.
+
+    Each device is stored by address with its name, UUIDs, capabilities,
+    owning adapter and the outcome and timing of its last connection
+    attempt, so that the device list and autoconnect are available at
+    start-up before bluetoothd has been asked about any device.  Changes
+    are collected and written out at most every ``flush_delay`` seconds,
+    by writing a temporary file and renaming it over the cache file so a
+    crash can never leave a partially written cache behind.
+    """
+    def __init__(self, path, flush_delay=5):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.records = {}
+        self._timer = None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if (data.get('version') == CACHE_VERSION):
+                self.records = dict((r['addr'], r) for r in data['devices'])
+        except IOError:
+            self.records = {}
+        except Exception as e:
+            logger.warning('BTDeviceManager ignoring unreadable device cache %s: %s',
+                           self.path, e)
+            self.records = {}
+        return self.records
+
+    def get(self, addr):
+        return self.records.get(addr)
+
+    def update(self, addr, **fields):
+        record = self.records.setdefault(addr, {'addr': addr})
+        changed = False
+        for name, value in fields.items():
+            if (record.get(name) != value):
+                record[name] = value
+                changed = True
+        if (changed):
+            self._schedule_flush()
+        return record
+
+    def remove(self, addr):
+        if (self.records.pop(addr, None) is not None):
+            self._schedule_flush()
+
+    def retain(self, addrs):
+        """
+        Drop every record whose address is not in ``addrs``
+        """
+        for addr in list(self.records.keys()):
+            if (addr not in addrs):
+                self.remove(addr)
+
+    def flush(self):
+        if (self._timer is not None):
+            gobject.source_remove(self._timer)
+            self._timer = None
+        data = {'version': CACHE_VERSION,
+                'devices': sorted(self.records.values(), key=lambda r: r['addr'])}
+        directory = os.path.dirname(self.path)
+        try:
+            if (not os.path.isdir(directory)):
+                os.makedirs(directory)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.devices')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.rename(tmp_path, self.path)
+        except Exception as e:
+            logger.warning('BTDeviceManager unable to write device cache %s: %s',
+                           self.path, e)
+
+    def _schedule_flush(self):
+        if (self._timer is None):
+            self._timer = gobject.timeout_add(int(self.flush_delay * 1000),
+                                              self._on_flush_timer)
+
+    def _on_flush_timer(self):
+        self._timer = None
+        self.flush()
+        return False
@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import bt_manager
+
+
+def service_to_capability(service):
+    if (service.name == 'AudioSource'):
+        return service.name
+    elif (service.name == 'AudioSink'):
+        return service.name
+    elif (service.name == 'AVRemoteControl'):
+        return 'InputControl'
+    elif (service.name == 'HumanInterfaceDeviceService'):
+        return 'InputControl'
+    else:
+        return None
+
+
+class CapabilityCache(object):
+    """
+    Memoized translation of service UUIDs into device capabilities.
+
+    The 16-bit service table is precomputed once from
+    :data:`bt_manager.SERVICES`.  Raw UUID strings and complete UUID lists
+    are then translated lazily and remembered, up to ``max_size`` entries
+    each, so that repeat discovery events for the same profiles do not
+    construct :class:`bt_manager.BTUUID` objects again.  Capabilities are
+    returned as shared, immutable tuples.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._services = {}
+        for uuid16, service in bt_manager.SERVICES.items():
+            cap = service_to_capability(service)
+            if (cap is not None):
+                self._services[uuid16] = cap
+        self._uuids = {}
+        self._lists = {}
+
+    def uuid_to_capability(self, uuid):
+        try:
+            return self._uuids[uuid]
+        except KeyError:
+            pass
+        try:
+            cap = self._services.get(bt_manager.BTUUID(uuid).uuid16)
+        except Exception:
+            cap = None
+        if (len(self._uuids) >= self.max_size):
+            self._uuids.clear()
+        self._uuids[uuid] = cap
+        return cap
+
+    def capabilities(self, uuids):
+        key = tuple(uuids)
+        try:
+            return self._lists[key]
+        except KeyError:
+            pass
+        caps = []
+        for i in key:
+            cap = self.uuid_to_capability(i)
+            if (cap is not None and cap not in caps):
+                caps.append(cap)
+        caps = tuple(caps)
+        if (len(self._lists) >= self.max_size):
+            self._lists.clear()
+        self._lists[key] = caps
+        return caps
+
+    def __len__(self):
+        return len(self._uuids)
@@ -0,0 +1,66 @@
+from __future__ import unicode_literals
+
+import collections
+import threading
+
+CHANGE_ADDED = 'added'
+CHANGE_UPDATED = 'updated'
+CHANGE_REMOVED = 'removed'
+
+
+class ChangeFeed(object):
+    """
+    Versioned feed of device registry changes.
+
+    Every change is given the next version number and the most recent
+    ``max_size`` changes are kept, so a client that remembers the version
+    it last saw can catch up with just the changes since.  A client that
+    has fallen further behind than the feed reaches is given a snapshot of
+    the current device state instead.
+    """
+    def __init__(self, max_size=1024):
+        self.version = 0
+        self._changes = collections.deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return self._changes.maxlen
+
+    @max_size.setter
+    def max_size(self, max_size):
+        with self._lock:
+            self._changes = collections.deque(self._changes, maxlen=max_size)
+
+    def record(self, addr, change, properties=None):
+        with self._lock:
+            self.version += 1
+            self._changes.append({'version': self.version,
+                                  'addr': addr,
+                                  'change': change,
+                                  'properties': properties})
+            return self.version
+
+    def reset(self):
+        """
+        Drop all changes, so that every client is sent a snapshot next
+        """
+        with self._lock:
+            self.version += 1
+            self._changes.clear()
+
+    def since(self, version, snapshot_fn):
+        """
+        Get the changes after ``version``, or a snapshot from
+        ``snapshot_fn`` if they are no longer all held
+        """
+        with self._lock:
+            current = self.version
+            if (version == current):
+                return {'version': current, 'changes': []}
+            # Versions ahead of the feed are from before a restart
+            if (version > current or not self._changes or
+                    self._changes[0]['version'] > version + 1):
+                return {'version': current, 'snapshot': snapshot_fn()}
+            return {'version': current,
+                    'changes': [c for c in self._changes if c['version'] > version]}
@@ -0,0 +1,171 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_IDLE = 'idle'
+STATE_CONNECTING = 'connecting'
+STATE_CONNECTED = 'connected'
+STATE_FAILED = 'failed'
+
+
+class ConnectAttempt(object):
+    """
+    Progress of a single connection attempt to a device's profiles
+    """
+    __slots__ = ('addr', 'state', 'pending', 'connected', 'errors',
+                 'started', 'finished', 'event')
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.state = STATE_IDLE
+        self.pending = 0
+        self.connected = []
+        self.errors = []
+        self.started = None
+        self.finished = None
+        self.event = threading.Event()
+
+    @property
+    def elapsed(self):
+        if (self.started is None):
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self):
+        return {'addr': self.addr,
+                'state': self.state,
+                'connected': list(self.connected),
+                'errors': [str(e) for e in self.errors],
+                'elapsed': self.elapsed}
+
+
+class ConnectEngine(object):
+    """
+    Non-blocking connection engine with a per-device state machine.
+
+    Each profile connect is issued as an asynchronous D-Bus call, with the
+    reply delivered on the main loop, so a slow or unreachable device
+    never blocks the caller.  Several devices may be connecting at the
+    same time.  A device moves from ``idle`` to ``connecting`` and then to
+    ``connected`` once at least one profile has connected, or ``failed``
+    if every profile failed or timed out.  The ``on_complete`` callback is
+    invoked with the :class:`ConnectAttempt` when an attempt finishes.
+    """
+    def __init__(self, timeout=10, on_complete=None):
+        self.timeout = timeout
+        self.on_complete = on_complete
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def connect(self, addr, profiles):
+        """
+        Start connecting the given (name, profile) pairs of a device.
+
+        Returns the device's :class:`ConnectAttempt`; if an attempt is
+        already in progress it is returned unchanged.
+        """
+        with self._lock:
+            attempt = self._attempts.get(addr)
+            if (attempt is not None and attempt.state == STATE_CONNECTING):
+                return attempt
+            attempt = ConnectAttempt(addr)
+            attempt.state = STATE_CONNECTING
+            attempt.started = time.time()
+            attempt.pending = len(profiles)
+            self._attempts[addr] = attempt
+        if (not profiles):
+            self._finish(attempt)
+            return attempt
+        for name, profile in profiles:
+            self._connect_profile(attempt, name, profile)
+        return attempt
+
+    def _connect_profile(self, attempt, name, profile):
+        def reply_handler(*args):
+            self._on_reply(attempt, name, None)
+
+        def error_handler(error):
+            self._on_reply(attempt, name, error)
+
+        try:
+            profile._interface.Connect(reply_handler=reply_handler,
+                                       error_handler=error_handler,
+                                       timeout=self.timeout)
+        except Exception as e:
+            self._on_reply(attempt, name, e)
+
+    def _on_reply(self, attempt, name, error):
+        with self._lock:
+            if (error is None):
+                attempt.connected.append(name)
+            else:
+                logger.warning('BTDeviceManager connect profile=%s dev=%s '
+                               'failed: %s', name, attempt.addr, error)
+                attempt.errors.append(error)
+            attempt.pending -= 1
+            done = attempt.pending <= 0
+        if (done):
+            self._finish(attempt)
+
+    def _finish(self, attempt):
+        with self._lock:
+            if (attempt.state != STATE_CONNECTING):
+                return
+            if (attempt.connected):
+                attempt.state = STATE_CONNECTED
+            else:
+                attempt.state = STATE_FAILED
+            attempt.finished = time.time()
+        attempt.event.set()
+        if (self.on_complete is not None):
+            self.on_complete(attempt)
+
+    def set_connected(self, addr, connected):
+        """
+        Track connection state changes reported by the device itself
+        """
+        with self._lock:
+            attempt = self._attempts.get(addr)
+            if (attempt is None):
+                attempt = self._attempts[addr] = ConnectAttempt(addr)
+            # An attempt in progress is left to finish from its connect
+            # replies, which may arrive after the device reports itself
+            # connected
+            if (attempt.state == STATE_CONNECTING):
+                pass
+            elif (connected):
+                attempt.state = STATE_CONNECTED
+            else:
+                attempt.state = STATE_IDLE
+        return attempt
+
+    def forget(self, addr):
+        with self._lock:
+            self._attempts.pop(addr, None)
+
+    def state(self, addr):
+        attempt = self._attempts.get(addr)
+        if (attempt is None):
+            return STATE_IDLE
+        return attempt.state
+
+    def is_connecting(self, addr):
+        return self.state(addr) == STATE_CONNECTING
+
+    def attempt(self, addr):
+        return self._attempts.get(addr)
+
+    def wait(self, addr, timeout=None):
+        """
+        Block until the current attempt for a device has completed,
+        returning its final state
+        """
+        attempt = self._attempts.get(addr)
+        if (attempt is None):
+            return STATE_IDLE
+        attempt.event.wait(timeout)
+        return attempt.state
@@ -0,0 +1,214 @@
+from __future__ import unicode_literals
+
+import logging
+import time
+
+import gobject
+
+logger = logging.getLogger(__name__)
+
+
+class Sighting(object):
+    """
+    Last reported state of a discovered device
+    """
+    __slots__ = ('name', 'uuids', 'rssi', 'time')
+
+    def __init__(self, name, uuids, rssi, time):
+        self.name = name
+        self.uuids = uuids
+        self.rssi = rssi
+        self.time = time
+
+
+class DiscoveryCoalescer(object):
+    """
+    Coalesces repeated device found reports from inquiry.
+
+    BlueZ reports the same addresses again every few seconds while
+    discovery is active.  A report is only let through on the first
+    sighting of an address within ``window`` seconds, or when it carries a
+    real change: a new name, a new set of UUIDs or an RSSI that has moved
+    by at least ``rssi_delta`` dBm.  Everything else is either dropped
+    (identical report) or coalesced (minor RSSI jitter) and counted.
+    """
+    def __init__(self, window=30, rssi_delta=10, max_size=1024):
+        self.window = window
+        self.rssi_delta = rssi_delta
+        self.max_size = max_size
+        self.emitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._seen = {}
+
+    def offer(self, addr, name, uuids, rssi=None, now=None):
+        """
+        Offer a device found report, returning True if it should be
+        delivered to listeners
+        """
+        if (now is None):
+            now = time.time()
+        uuids = tuple(uuids)
+        last = self._seen.get(addr)
+        if (last is None or now - last.time >= self.window):
+            return self._emit(addr, name, uuids, rssi, now)
+        if ((name is not None and name != last.name) or
+                (uuids and uuids != last.uuids)):
+            return self._emit(addr, name or last.name, uuids or last.uuids,
+                              rssi, now)
+        if (rssi is not None and last.rssi is not None and
+                abs(rssi - last.rssi) >= self.rssi_delta):
+            return self._emit(addr, last.name, last.uuids, rssi, now)
+        if (rssi is not None and rssi != last.rssi):
+            self.coalesced += 1
+        else:
+            self.dropped += 1
+        return False
+
+    def forget(self, addr):
+        self._seen.pop(addr, None)
+
+    def clear(self):
+        self._seen.clear()
+
+    def stats(self):
+        return {'emitted': self.emitted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'tracked': len(self._seen)}
+
+    def _emit(self, addr, name, uuids, rssi, now):
+        if (addr not in self._seen and len(self._seen) >= self.max_size):
+            self._expire(now)
+        self._seen[addr] = Sighting(name, uuids, rssi, now)
+        self.emitted += 1
+        return True
+
+    def _expire(self, now):
+        for addr, sighting in list(self._seen.items()):
+            if (now - sighting.time >= self.window):
+                del self._seen[addr]
+        if (len(self._seen) >= self.max_size):
+            self._seen.clear()
+
+
+class DiscoveryScheduler(object):
+    """
+    Duty cycles device discovery around active audio streams.
+
+    Inquiry competes for airtime with A2DP links, so rather than leaving
+    discovery running it is run in bursts of ``burst`` seconds.  While
+    ``streaming_fn`` reports that an audio sink is connected the pause
+    between bursts doubles each cycle, starting from twice ``idle`` and up
+    to ``idle_max`` seconds.  With no sink connected the pause drops back
+    to ``idle`` seconds.  A ``burst`` of zero leaves discovery running
+    continuously.
+    """
+    def __init__(self, start_fn, stop_fn, streaming_fn, burst=10, idle=5,
+                 idle_max=300):
+        self.start_fn = start_fn
+        self.stop_fn = stop_fn
+        self.streaming_fn = streaming_fn
+        self.burst = burst
+        self.idle = idle
+        self.idle_max = idle_max
+        self.running = False
+        self.discovering = False
+        self.current_idle = idle
+        self.inquiry_time = 0
+        self._started_at = None
+        self._timer = None
+
+    def start(self):
+        self.running = True
+        self.current_idle = self.idle
+        self._start_burst()
+
+    def stop(self):
+        self.running = False
+        self._cancel_timer()
+        if (self.discovering):
+            self._stop_inquiry()
+
+    def restart(self):
+        if (self.running):
+            self.stop()
+            self.start()
+
+    def kick(self):
+        """
+        Resume discovery straight away if no audio sink is connected,
+        e.g., after a sink has dropped its connection
+        """
+        if (self.running and not self.discovering and not self.streaming_fn()):
+            self._cancel_timer()
+            self.current_idle = self.idle
+            self._start_burst()
+
+    @property
+    def duty_cycle(self):
+        if (not self.running):
+            return 0.0
+        if (self.burst <= 0):
+            return 1.0
+        return float(self.burst) / (self.burst + self.current_idle)
+
+    def total_inquiry_time(self):
+        total = self.inquiry_time
+        if (self._started_at is not None):
+            total += time.time() - self._started_at
+        return total
+
+    def stats(self):
+        return {'duty_cycle': self.duty_cycle,
+                'inquiry_time': self.total_inquiry_time(),
+                'discovering': self.discovering,
+                'idle': self.current_idle}
+
+    def _start_inquiry(self):
+        self.discovering = True
+        self._started_at = time.time()
+        try:
+            self.start_fn()
+        except Exception as e:
+            logger.warning('BTDeviceManager unable to start discovery: %s', e)
+
+    def _stop_inquiry(self):
+        self.discovering = False
+        if (self._started_at is not None):
+            self.inquiry_time += time.time() - self._started_at
+            self._started_at = None
+        try:
+            self.stop_fn()
+        except Exception as e:
+            logger.warning('BTDeviceManager unable to stop discovery: %s', e)
+
+    def _start_burst(self):
+        self._start_inquiry()
+        if (self.burst > 0):
+            self._timer = gobject.timeout_add(int(self.burst * 1000),
+                                              self._on_burst_end)
+
+    def _on_burst_end(self):
+        self._timer = None
+        self._stop_inquiry()
+        if (self.streaming_fn()):
+            self.current_idle = min(self.idle_max,
+                                    max(self.current_idle, self.idle, 1) * 2)
+        else:
+            self.current_idle = self.idle
+        logger.debug('BTDeviceManager discovery paused for %ds',
+                     self.current_idle)
+        self._timer = gobject.timeout_add(int(self.current_idle * 1000),
+                                          self._on_idle_end)
+        return False
+
+    def _on_idle_end(self):
+        self._timer = None
+        self._start_burst()
+        return False
+
+    def _cancel_timer(self):
+        if (self._timer is not None):
+            gobject.source_remove(self._timer)
+            self._timer = None
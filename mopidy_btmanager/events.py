@@ -0,0 +1,128 @@
+from __future__ import unicode_literals
+
+import collections
+import logging
+import threading
+import time
+
+from mopidy import service
+
+logger = logging.getLogger(__name__)
+
+# Events that are always queued, however far behind listeners are
+CRITICAL_EVENTS = frozenset([
+    'bluetooth_device_connected',
+    'bluetooth_device_disconnected',
+    'bluetooth_device_connect_failed',
+    'bluetooth_pass_key_confirmation',
+    'bluetooth_pin_code_requested',
+    'service_started',
+    'service_stopped',
+])
+
+PROPERTY_CHANGED_EVENT = 'bluetooth_device_property_changed'
+
+
+class EventDispatcher(object):
+    """
+    Delivers ServiceListener events from a dedicated thread.
+
+    Events are queued by :meth:`send` and handed to listeners once
+    ``batch_window`` seconds have passed since the first event of a
+    burst, so that slow listeners never hold up the handling of bluetooth
+    signals.  Property changes of a device that are still queued are
+    merged into a single event carrying all changed properties.  Once
+    ``max_size`` events are queued further events are dropped and
+    counted, except for those in :data:`CRITICAL_EVENTS`.
+    """
+    def __init__(self, max_size=1000, batch_window=0.05):
+        self.max_size = max_size
+        self.batch_window = batch_window
+        self.delivered = 0
+        self.merged = 0
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._pending_props = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if (self._running):
+                return
+            self._running = True
+            # A thread that outlived stop() is still delivering, and
+            # carries on so that events stay in order
+            if (self._thread is not None):
+                return
+            self._thread = threading.Thread(target=self._run,
+                                            name='BTDeviceManagerEvents')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=1):
+        """
+        Stop the dispatcher once the events already queued are delivered
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+            thread = self._thread
+        if (thread is not None):
+            thread.join(timeout)
+
+    def send(self, event, **kwargs):
+        with self._cond:
+            addr = kwargs.get('device', {}).get('addr')
+            if (event == PROPERTY_CHANGED_EVENT):
+                pending = self._pending_props.get(addr)
+                if (pending is not None):
+                    pending[1]['property_dict'].update(kwargs['property_dict'])
+                    self.merged += 1
+                    return
+            if (len(self._queue) >= self.max_size and
+                    event not in CRITICAL_EVENTS):
+                self.dropped += 1
+                return
+            item = (event, kwargs)
+            if (event == PROPERTY_CHANGED_EVENT):
+                kwargs['property_dict'] = dict(kwargs['property_dict'])
+                self._pending_props[addr] = item
+            else:
+                # Keep later property changes behind this event
+                self._pending_props.pop(addr, None)
+            self._queue.append(item)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {'queued': len(self._queue),
+                    'delivered': self.delivered,
+                    'merged': self.merged,
+                    'dropped': self.dropped}
+
+    def _run(self):
+        while (True):
+            with self._cond:
+                while (self._running and not self._queue):
+                    self._cond.wait()
+                if (not self._queue):
+                    self._thread = None
+                    return
+                running = self._running
+            if (running):
+                # Let the rest of a burst catch up before delivering
+                time.sleep(self.batch_window)
+            with self._cond:
+                batch = list(self._queue)
+                self._queue.clear()
+                self._pending_props.clear()
+            for event, kwargs in batch:
+                try:
+                    service.ServiceListener.send(event, **kwargs)
+                except Exception as e:
+                    logger.error('BTDeviceManager event=%s delivery error: %s',
+                                 event, e)
+            with self._cond:
+                self.delivered += len(batch)
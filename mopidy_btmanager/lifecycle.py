@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import logging
+
+import gobject
+
+logger = logging.getLogger(__name__)
+
+
+class SinkLifecycle(object):
+    """
+    Detaches the audio sinks of devices that have gone away.
+
+    Every attached sink is tracked by device address.  When its device is
+    lost, ``detach_fn`` is called with the address once ``grace`` seconds
+    have passed, unless the sink was marked attached again in the meantime
+    so that a device reconnecting briefly keeps its sink.  A ``grace`` of
+    zero detaches straight away.
+    """
+    def __init__(self, detach_fn, grace=5):
+        self.detach_fn = detach_fn
+        self.grace = grace
+        self.expired = 0
+        self._attached = set()
+        self._timers = {}
+
+    def attached(self, address):
+        self._cancel(address)
+        self._attached.add(address)
+
+    def detached(self, address):
+        self._cancel(address)
+        self._attached.discard(address)
+
+    def lost(self, address, grace=None):
+        if (address not in self._attached or address in self._timers):
+            return
+        if (grace is None):
+            grace = self.grace
+        if (grace <= 0):
+            self._expire(address)
+        else:
+            self._timers[address] = gobject.timeout_add(int(grace * 1000),
+                                                        self._on_timer, address)
+
+    def is_pending(self, address):
+        return address in self._timers
+
+    def clear(self):
+        for address in list(self._timers.keys()):
+            self._cancel(address)
+        self._attached.clear()
+
+    def stats(self):
+        return {'sinks': len(self._attached),
+                'pending_detach': sorted(self._timers.keys()),
+                'expired': self.expired}
+
+    def _cancel(self, address):
+        timer = self._timers.pop(address, None)
+        if (timer is not None):
+            gobject.source_remove(timer)
+
+    def _on_timer(self, address):
+        self._timers.pop(address, None)
+        self._expire(address)
+        return False
+
+    def _expire(self, address):
+        logger.info('BTDeviceManager detaching audio sink of lost dev=%s', address)
+        self.expired += 1
+        self.detach_fn(address)
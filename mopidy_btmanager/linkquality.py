@@ -0,0 +1,147 @@
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+
+class LinkQuality(object):
+    """
+    Recent link quality samples of a device
+    """
+    __slots__ = ('rssi', 'drops', 'stalls', 'updated')
+
+    def __init__(self, window):
+        self.rssi = collections.deque(maxlen=window)
+        self.drops = collections.deque(maxlen=window)
+        self.stalls = collections.deque(maxlen=window)
+        self.updated = 0
+
+    def resize(self, window):
+        """
+        Keep up to ``window`` of the most recent samples of each kind
+        """
+        self.rssi = collections.deque(self.rssi, maxlen=window)
+        self.drops = collections.deque(self.drops, maxlen=window)
+        self.stalls = collections.deque(self.stalls, maxlen=window)
+
+
+class LinkMonitor(object):
+    """
+    Tracks the link quality of devices over a rolling window.
+
+    The last ``window`` RSSI readings from inquiry are kept per device,
+    along with the times of its last ``window`` connection drops and
+    audio stalls.  A link is considered to be degrading when its recent
+    RSSI readings are below ``rssi_threshold`` and falling, or when it
+    dropped or stalled ``burst`` times within ``period`` seconds.  At most
+    ``max_size`` devices are tracked, the least recently updated being
+    forgotten first.
+
+    BlueZ only reports RSSI from inquiry, which is paused while audio is
+    streaming, so the RSSI of a streaming link is mostly that from before
+    it started; stalls and drops are what show its link degrading.
+    """
+    def __init__(self, window=10, rssi_threshold=-80, period=30, burst=3,
+                 max_size=256):
+        self._links = {}
+        self._lock = threading.Lock()
+        self.window = window
+        self.rssi_threshold = rssi_threshold
+        self.period = period
+        self.burst = burst
+        self.max_size = max_size
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, window):
+        with self._lock:
+            self._window = window
+            for link in self._links.values():
+                link.resize(window)
+
+    def _link(self, addr, now):
+        link = self._links.get(addr)
+        if (link is None):
+            if (len(self._links) >= self.max_size):
+                oldest = min(self._links, key=lambda x: self._links[x].updated)
+                del self._links[oldest]
+            link = self._links[addr] = LinkQuality(self.window)
+        link.updated = now
+        return link
+
+    def record_rssi(self, addr, rssi, now=None):
+        with self._lock:
+            self._link(addr, now or time.time()).rssi.append(rssi)
+
+    def record_drop(self, addr, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._link(addr, now).drops.append(now)
+
+    def record_stall(self, addr, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._link(addr, now).stalls.append(now)
+
+    def forget(self, addr):
+        with self._lock:
+            self._links.pop(addr, None)
+
+    def clear(self):
+        with self._lock:
+            self._links.clear()
+
+    def rssi(self, addr):
+        """
+        Mean of the device's recent RSSI readings, or None if there are none
+        """
+        with self._lock:
+            link = self._links.get(addr)
+            if (link is None or not link.rssi):
+                return None
+            return float(sum(link.rssi)) / len(link.rssi)
+
+    def is_degrading(self, addr, now=None):
+        now = now or time.time()
+        with self._lock:
+            link = self._links.get(addr)
+            if (link is None):
+                return False
+            return self._is_degrading(link, now)
+
+    def _is_degrading(self, link, now):
+        for times in (link.drops, link.stalls):
+            if (len([t for t in times if now - t <= self.period]) >= self.burst):
+                return True
+        samples = list(link.rssi)
+        recent = samples[-self.burst:]
+        if (len(samples) > len(recent)):
+            recent_mean = float(sum(recent)) / len(recent)
+            mean = float(sum(samples)) / len(samples)
+            return recent_mean < self.rssi_threshold and recent_mean < mean
+        return False
+
+    def sort_key(self, addr):
+        """
+        Key ordering devices from the strongest to the weakest link, with
+        devices of unknown RSSI last
+        """
+        rssi = self.rssi(addr)
+        if (rssi is None):
+            return (1, 0)
+        return (0, -rssi)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return dict((addr, {'rssi': list(link.rssi),
+                                'drops': len([t for t in link.drops
+                                              if now - t <= self.period]),
+                                'stalls': len([t for t in link.stalls
+                                               if now - t <= self.period]),
+                                'degrading': self._is_degrading(link, now)})
+                        for addr, link in self._links.items())
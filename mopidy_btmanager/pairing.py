@@ -0,0 +1,94 @@
+from __future__ import unicode_literals
+
+import time
+
+import gobject
+
+
+class PendingPairing(object):
+    """
+    A pairing in progress, with the PIN code to give for the device
+    """
+    __slots__ = ('addr', 'pincode', 'adapter_id', 'started', 'timer')
+
+    def __init__(self, addr, pincode, adapter_id):
+        self.addr = addr
+        self.pincode = pincode
+        self.adapter_id = adapter_id
+        self.started = time.time()
+        self.timer = None
+
+    def to_dict(self):
+        return {'addr': self.addr,
+                'adapter': self.adapter_id,
+                'elapsed': time.time() - self.started}
+
+
+class PairingTable(object):
+    """
+    Pairings in progress, by device address.
+
+    Agent requests are answered from the pairing of the device they are
+    for, so several devices can be paired at once, each with its own PIN
+    code.  A pairing that has not completed within ``timeout`` seconds is
+    dropped and passed to ``on_timeout``.
+    """
+    def __init__(self, timeout=60, on_timeout=None):
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self._pairings = {}
+
+    def add(self, addr, pincode=None, adapter_id=None, timeout=None):
+        self.remove(addr)
+        pairing = PendingPairing(addr, pincode, adapter_id)
+        if (timeout is None):
+            timeout = self.timeout
+        if (timeout > 0):
+            pairing.timer = gobject.timeout_add(int(timeout * 1000),
+                                                self._on_timeout, pairing)
+        self._pairings[addr] = pairing
+        return pairing
+
+    def get(self, addr):
+        return self._pairings.get(addr)
+
+    def complete(self, addr, success=True):
+        pairing = self.remove(addr)
+        if (pairing is not None):
+            if (success):
+                self.completed += 1
+            else:
+                self.failed += 1
+        return pairing
+
+    def remove(self, addr):
+        pairing = self._pairings.pop(addr, None)
+        if (pairing is not None and pairing.timer is not None):
+            gobject.source_remove(pairing.timer)
+            pairing.timer = None
+        return pairing
+
+    def clear(self):
+        for addr in list(self._pairings.keys()):
+            self.remove(addr)
+
+    def __contains__(self, addr):
+        return addr in self._pairings
+
+    def stats(self):
+        return {'pending': [pairing.to_dict() for pairing in self._pairings.values()],
+                'completed': self.completed,
+                'failed': self.failed,
+                'timed_out': self.timed_out}
+
+    def _on_timeout(self, pairing):
+        pairing.timer = None
+        if (self._pairings.get(pairing.addr) is pairing):
+            del self._pairings[pairing.addr]
+            self.timed_out += 1
+            if (self.on_timeout is not None):
+                self.on_timeout(pairing)
+        return False
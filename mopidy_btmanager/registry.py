@@ -0,0 +1,116 @@
+from __future__ import unicode_literals
+
+
+def normalize_address(addr):
+    """
+    Addresses are matched case-insensitively, as bluetoothd does
+    """
+    return addr.upper()
+
+
+def path_to_address(path):
+    """
+    Translate a bluez device object path into a device address
+
+    Device paths take the form ``.../dev_XX_XX_XX_XX_XX_XX`` so the
+    address can be recovered without a round trip to bluetoothd.
+    """
+    return str(path)[-17:].replace('_', ':')
+
+
+class DeviceEntry(object):
+    """
+    A single registry record tying a device address to its D-Bus object
+    path, :class:`bt_manager.BTDevice` instance, owning adapter and a
+    snapshot of the device's properties.  The ``bt_device`` may be None
+    until the device object is first needed.
+    """
+    __slots__ = ('addr', 'path', 'bt_device', 'props', 'adapter')
+
+    def __init__(self, addr, path, bt_device, props, adapter=None):
+        self.addr = addr
+        self.path = path
+        self.bt_device = bt_device
+        self.props = props
+        self.adapter = adapter
+
+
+class DeviceRegistry(object):
+    """
+    In-process registry of devices known to the adapter, indexed by both
+    device address and D-Bus object path.
+
+    The registry is kept current from the adapter's device created/removed
+    signals so that address lookups are plain dictionary hits rather than
+    ``find_device`` calls on the system bus.  Each entry also holds a
+    property snapshot, filled once on registration and patched in place
+    from property changed signals, so that reading device state does not
+    require a D-Bus property fetch.
+    """
+    def __init__(self):
+        self._by_addr = {}
+        self._by_path = {}
+
+    def add(self, path, bt_device, props=None, addr=None, adapter=None):
+        path = str(path)
+        if (addr is None):
+            addr = path_to_address(path)
+        addr = normalize_address(addr)
+        entry = DeviceEntry(addr, path, bt_device, dict(props or {}), adapter)
+        self._by_addr[addr] = entry
+        self._by_path[path] = entry
+        return entry
+
+    def remove(self, path):
+        entry = self._by_path.pop(str(path), None)
+        if (entry is not None):
+            self._by_addr.pop(entry.addr, None)
+        return entry
+
+    def update(self, path, name, value):
+        entry = self._by_path.get(str(path))
+        if (entry is not None):
+            entry.props[name] = value
+        return entry
+
+    def clear(self):
+        self._by_addr.clear()
+        self._by_path.clear()
+
+    def entry(self, addr):
+        return self._by_addr.get(normalize_address(addr))
+
+    def entry_by_path(self, path):
+        return self._by_path.get(str(path))
+
+    def get(self, addr):
+        entry = self._by_addr.get(normalize_address(addr))
+        if (entry is not None):
+            return entry.bt_device
+
+    def get_by_path(self, path):
+        entry = self._by_path.get(str(path))
+        if (entry is not None):
+            return entry.bt_device
+
+    def props_of(self, addr):
+        entry = self._by_addr.get(normalize_address(addr))
+        if (entry is not None):
+            return entry.props
+
+    def path_of(self, addr):
+        entry = self._by_addr.get(normalize_address(addr))
+        if (entry is not None):
+            return entry.path
+
+    def entries(self, adapter=None):
+        if (adapter is None):
+            return list(self._by_path.values())
+        return [entry for entry in self._by_path.values()
+                if entry.adapter == adapter]
+
+    def __contains__(self, addr):
+        return normalize_address(addr) in self._by_addr
+
+    def __len__(self):
+        return len(self._by_path)
@@ -0,0 +1,200 @@
+from __future__ import unicode_literals
+
+import logging
+import random
+import threading
+import time
+
+import gobject
+
+from .connect import STATE_CONNECTED, STATE_CONNECTING
+
+logger = logging.getLogger(__name__)
+
+
+class Backoff(object):
+    """
+    Reconnect backoff state of a device
+    """
+    __slots__ = ('failures', 'next_time')
+
+    def __init__(self):
+        self.failures = 0
+        self.next_time = 0
+
+
+class AutoconnectScheduler(object):
+    """
+    Schedules automatic connection attempts to known devices.
+
+    Requests are queued per address and started in priority order, with
+    at most ``concurrency`` attempts in flight at any one time.  Devices
+    are ranked by their position in ``priority``, which may list device
+    addresses or names; unlisted devices come last.  Devices of the same
+    rank are ordered by ``key_fn(addr)``, if given, and then by request
+    order.  A failed attempt pushes the device's next attempt back
+    exponentially, from ``backoff`` up to ``backoff_max`` seconds, with
+    random jitter so that devices which failed together do not retry in
+    lockstep.
+
+    ``connect_fn`` is called with a device address to start an attempt
+    and returns the resulting connection state; :meth:`completed` must be
+    called once an attempt that returned ``connecting`` has finished.
+    """
+    def __init__(self, connect_fn, concurrency=2, priority=None, backoff=5,
+                 backoff_max=300, jitter=0.2, key_fn=None):
+        self.connect_fn = connect_fn
+        self.key_fn = key_fn
+        self.concurrency = concurrency
+        self.priority = list(priority or [])
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.enabled = False
+        self._queue = {}
+        self._order = 0
+        self._active = set()
+        self._held = set()
+        self._backoff = {}
+        self._timer = None
+        self._pumping = False
+        self._lock = threading.RLock()
+
+    def start(self):
+        with self._lock:
+            self.enabled = True
+            self._pump()
+
+    def stop(self):
+        with self._lock:
+            self.enabled = False
+            self._queue.clear()
+            self._cancel_timer()
+
+    def request(self, addr, name=None):
+        """
+        Ask for a device to be connected as soon as its backoff allows
+        """
+        with self._lock:
+            if (not self.enabled or addr in self._held or
+                    addr in self._active or addr in self._queue):
+                return
+            self._order += 1
+            self._queue[addr] = (self.rank(addr, name), self._order)
+            self._pump()
+
+    def hold(self, addr):
+        """
+        Stop automatically connecting a device, e.g., after it was
+        deliberately disconnected
+        """
+        with self._lock:
+            self._held.add(addr)
+            self._queue.pop(addr, None)
+
+    def release(self, addr):
+        with self._lock:
+            self._held.discard(addr)
+
+    def is_held(self, addr):
+        return addr in self._held
+
+    def forget(self, addr):
+        with self._lock:
+            self._queue.pop(addr, None)
+            self._backoff.pop(addr, None)
+
+    def completed(self, addr, success):
+        with self._lock:
+            self._record(addr, success)
+            self._pump()
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {'enabled': self.enabled,
+                    'active': sorted(self._active),
+                    'queued': [addr for addr, _ in sorted(self._queue.items(),
+                                                          key=lambda x: x[1])],
+                    'backoff': dict((addr, max(0, s.next_time - now))
+                                    for addr, s in self._backoff.items())}
+
+    def _record(self, addr, success):
+        was_active = addr in self._active
+        self._active.discard(addr)
+        if (success):
+            self._backoff.pop(addr, None)
+        elif (was_active):
+            state = self._backoff.setdefault(addr, Backoff())
+            state.failures += 1
+            delay = min(self.backoff_max,
+                        self.backoff * (2 ** (state.failures - 1)))
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+            state.next_time = time.time() + delay
+            logger.info('BTDeviceManager autoconnect dev=%s backing off '
+                        'for %.1fs after %d failures', addr, delay,
+                        state.failures)
+
+    def rank(self, addr, name=None):
+        for i, key in enumerate(self.priority):
+            if (key == addr or (name is not None and key == name)):
+                return i
+        return len(self.priority)
+
+    def _sort_key(self, addr, rank):
+        if (self.key_fn is None):
+            return rank
+        priority, order = rank
+        return (priority, self.key_fn(addr), order)
+
+    def _ready_time(self, addr):
+        state = self._backoff.get(addr)
+        if (state is None):
+            return 0
+        return state.next_time
+
+    def _pump(self):
+        if (self._pumping or not self.enabled):
+            return
+        self._pumping = True
+        try:
+            while (len(self._active) < self.concurrency):
+                now = time.time()
+                ready = [(self._sort_key(addr, rank), addr)
+                         for addr, rank in self._queue.items()
+                         if self._ready_time(addr) <= now]
+                if (not ready):
+                    break
+                addr = min(ready)[1]
+                del self._queue[addr]
+                self._active.add(addr)
+                try:
+                    state = self.connect_fn(addr)
+                except Exception as e:
+                    logger.error('BTDeviceManager autoconnect dev=%s '
+                                 'error: %s', addr, e)
+                    state = None
+                if (state != STATE_CONNECTING and addr in self._active):
+                    self._record(addr, state == STATE_CONNECTED)
+        finally:
+            self._pumping = False
+        self._schedule_timer()
+
+    def _schedule_timer(self):
+        self._cancel_timer()
+        if (not self._queue or len(self._active) >= self.concurrency):
+            return
+        delay = min(self._ready_time(addr) for addr in self._queue) - time.time()
+        self._timer = gobject.timeout_add(max(0, int(delay * 1000)) + 10,
+                                          self._on_timer)
+
+    def _cancel_timer(self):
+        if (self._timer is not None):
+            gobject.source_remove(self._timer)
+            self._timer = None
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._pump()
+        return False
@@ -1,22 +1,475 @@
 from __future__ import unicode_literals
 
+import functools
+import logging
+import threading
+import time
+
 import gobject
 
 import pygst
 pygst.require('0.10')
 import gst  # noqa
 
+logger = logging.getLogger(__name__)
+
+# Queue 'leaky' property values
+LEAKY_NONE = 0
+LEAKY_DOWNSTREAM = 2
+
+# Sink profiles trade latency against resilience to dropouts.  Each
+# profile gives the properties of the queue and SBC encoder elements and,
+# for the adaptive profile, the SBC bitpool range to move within.  Queues
+# are never leaky: the a2dpsink plays in real time, so a full queue holds
+# back the source rather than dropping audio, and its size is the latency
+# it adds.
+SINK_PROFILES = {
+    'default': {
+        'queue': {},
+        'sbcenc': {},
+    },
+    'low_latency': {
+        'queue': {'max-size-buffers': 0,
+                  'max-size-bytes': 0,
+                  'max-size-time': 100 * gst.MSECOND,
+                  'leaky': LEAKY_NONE},
+        'sbcenc': {'blocks': 4,
+                   'subbands': 4,
+                   'bitpool': 32},
+    },
+    'high_quality': {
+        'queue': {'max-size-buffers': 0,
+                  'max-size-bytes': 0,
+                  'max-size-time': 2 * gst.SECOND,
+                  'leaky': LEAKY_NONE},
+        'sbcenc': {'blocks': 16,
+                   'subbands': 8,
+                   'bitpool': 53},
+    },
+    'adaptive': {
+        'queue': {'max-size-buffers': 0,
+                  'max-size-bytes': 0,
+                  'max-size-time': 500 * gst.MSECOND,
+                  'leaky': LEAKY_NONE},
+        'sbcenc': {'blocks': 16,
+                   'subbands': 8,
+                   'bitpool': 53},
+        'bitpool': (20, 53, 4),
+    },
+}
+
+
+# Queue in front of each group member's a2dpsink
+MEMBER_QUEUE = {'max-size-buffers': 0,
+                'max-size-bytes': 0,
+                'max-size-time': 500 * gst.MSECOND,
+                'leaky': LEAKY_NONE}
+
+
+def _make_encoder(settings):
+    queue = gst.element_factory_make('queue')
+    sbcenc = gst.element_factory_make('sbcenc')
+    for name, value in settings['queue'].items():
+        queue.set_property(name, value)
+    for name, value in settings['sbcenc'].items():
+        sbcenc.set_property(name, value)
+    return queue, sbcenc
+
+
+def _make_a2dpsink(address):
+    a2dpsink = gst.element_factory_make('a2dpsink')
+    a2dpsink.set_property('device', address)
+    a2dpsink.set_property('async-handling', True)
+    return a2dpsink
+
+
+def query_sbc_caps(address):
+    """
+    Read the SBC capabilities of a connected device from an a2dpsink
+    brought up to READY, returning them as a caps string, or None if the
+    device's capabilities aren't known
+    """
+    a2dpsink = _make_a2dpsink(address)
+    try:
+        if (a2dpsink.set_state(gst.STATE_READY) == gst.STATE_CHANGE_FAILURE):
+            return None
+        caps = a2dpsink.get_pad('sink').get_caps()
+        if (caps is None or caps.is_any() or caps.is_empty()):
+            return None
+        return caps.to_string()
+    finally:
+        a2dpsink.set_state(gst.STATE_NULL)
+
+
+class DrainMonitor(object):
+    """
+    Tells a congested link apart from ordinary backpressure.
+
+    A queue in front of a real-time sink is normally full, with the sink
+    draining it at playback speed, so neither its fill level nor its
+    'overrun' signal says anything about the link.  Instead, the audio
+    leaving the queue is added up by a pad probe and, every ``interval``
+    seconds while the queue is playing, compared with the time that has
+    passed.  A link that drains less than ``ratio`` of playback speed
+    while audio is waiting for it, or none at all, is congested.
+    ``on_congested`` is called each time ``samples`` intervals in a row
+    were congested and ``on_clear`` each time as many were clear, both
+    from the main loop.
+    """
+    def __init__(self, queue, interval=1, ratio=0.9, samples=3):
+        self.queue = queue
+        self.interval = interval
+        self.ratio = ratio
+        self.samples = samples
+        self.on_congested = None
+        self.on_clear = None
+        self.congested = False
+        self.rate = None
+        self._drained = 0
+        self._started = None
+        self._last = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self._probe = queue.get_pad('src').add_buffer_probe(self._on_buffer)
+        self._timer = gobject.timeout_add(int(interval * 1000), self._on_timer)
+
+    def stop(self):
+        if (self._timer is not None):
+            gobject.source_remove(self._timer)
+            self._timer = None
+        if (self._probe is not None):
+            self.queue.get_pad('src').remove_buffer_probe(self._probe)
+            self._probe = None
+
+    def _on_buffer(self, pad, buffer):
+        # Called from the streaming thread
+        if (buffer.duration != gst.CLOCK_TIME_NONE):
+            with self._lock:
+                self._drained += buffer.duration
+        return True
+
+    def _on_timer(self):
+        now = time.time()
+        with self._lock:
+            drained, self._drained = self._drained, 0
+        started = self._started
+        if (self.queue.get_state(0)[1] != gst.STATE_PLAYING):
+            # Only whole intervals of playback are judged
+            self._started = None
+            self.rate = None
+            return True
+        self._started = now
+        if (started is not None and now > started):
+            self.rate = float(drained) / gst.SECOND / (now - started)
+            waiting = self.queue.get_property('current-level-buffers') > 0
+            self._sample(waiting and self.rate < self.ratio)
+        return True
+
+    def _sample(self, congested):
+        if (congested != self._last):
+            self._last = congested
+            self._count = 0
+        self._count += 1
+        if (self._count >= self.samples):
+            self._count = 0
+            self.congested = congested
+            callback = self.on_congested if congested else self.on_clear
+            if (callback is not None):
+                callback()
+
+
+class AdaptiveBitpool(object):
+    """
+    Steps the SBC bitpool down each time the link is congested, and back
+    up after it has been clear ``recover`` times in a row.
+
+    sbcenc reads its bitpool when its caps are negotiated, so a change
+    takes effect the next time the sink starts streaming.
+    """
+    def __init__(self, sbcenc, bitpool_range, recover=5):
+        self.sbcenc = sbcenc
+        self.minimum, self.maximum, self.step = bitpool_range
+        self.recover = recover
+        self._clear = 0
+
+    def _set_bitpool(self, bitpool):
+        bitpool = max(self.minimum, min(self.maximum, bitpool))
+        if (bitpool != self.sbcenc.get_property('bitpool')):
+            self.sbcenc.set_property('bitpool', bitpool)
+
+    def congested(self):
+        self._clear = 0
+        self._set_bitpool(self.sbcenc.get_property('bitpool') - self.step)
+
+    def clear(self):
+        self._clear += 1
+        if (self._clear >= self.recover):
+            self._clear = 0
+            self._set_bitpool(self.sbcenc.get_property('bitpool') + self.step)
+
+
+def _watch_drain(queue, adaptive):
+    drain = DrainMonitor(queue)
+    if (adaptive is not None):
+        drain.on_congested = adaptive.congested
+        drain.on_clear = adaptive.clear
+    return drain
+
 
 class BluetoothA2DPSink(gst.Bin):
-    def __init__(self, address):
+    def __init__(self, address, profile='default'):
         super(BluetoothA2DPSink, self).__init__()
-        queue = gst.element_factory_make('queue')
-        sbcenc = gst.element_factory_make('sbcenc')
-        a2dpsink = gst.element_factory_make('a2dpsink')
-        a2dpsink.set_property('device', address)
-        a2dpsink.set_property('async-handling', True)
+        settings = SINK_PROFILES[profile]
+        self.address = address
+        self.profile = profile
+        # Called from the main loop with the device address whenever the
+        # link has been stalled for a while
+        self.on_stall = None
+        queue, sbcenc = _make_encoder(settings)
+        a2dpsink = _make_a2dpsink(address)
         self.add_many(queue, sbcenc, a2dpsink)
         gst.element_link_many(queue, sbcenc, a2dpsink)
         pad = queue.get_pad('sink')
         ghost_pad = gst.GhostPad('sink', pad)
         self.add_pad(ghost_pad)
+        self.queue = queue
+        self.sbcenc = sbcenc
+        self.a2dpsink = a2dpsink
+        self.adaptive = None
+        if ('bitpool' in settings):
+            self.adaptive = AdaptiveBitpool(sbcenc, settings['bitpool'])
+        self.drain = DrainMonitor(queue)
+        self.drain.on_congested = self._on_congested
+        self.drain.on_clear = self._on_clear
+
+    def _on_congested(self):
+        if (self.adaptive is not None):
+            self.adaptive.congested()
+        if (self.on_stall is not None):
+            self.on_stall(self.address)
+
+    def _on_clear(self):
+        if (self.adaptive is not None):
+            self.adaptive.clear()
+
+    def buffered_bytes(self):
+        return self.queue.get_property('current-level-bytes')
+
+    def close(self):
+        """
+        Stop watching the link once the sink is no longer used
+        """
+        self.drain.stop()
+
+    def set_device(self, address):
+        self.set_state(gst.STATE_NULL)
+        self.a2dpsink.set_property('device', address)
+        self.address = address
+
+
+class BluetoothA2DPGroupSink(gst.Bin):
+    """
+    Streams to several devices through a single SBC encoder.
+
+    The bin runs ``queue ! sbcenc ! tee`` with a ``queue ! a2dpsink``
+    branch per member device, so the audio is only encoded once however
+    many devices are playing it.  Members may be added and removed while
+    the bin is playing.  All members must accept the same SBC settings,
+    which are given by the sink profile, so only devices with the same
+    SBC capabilities should be grouped.
+
+    Member queues are bounded and not leaky, so the group plays at the
+    pace of its members.  A member whose link stalls has its queue made
+    leaky until the link recovers, so that it can't hold up the others,
+    and is passed to ``on_stall``.
+    """
+    def __init__(self, profile='default'):
+        super(BluetoothA2DPGroupSink, self).__init__()
+        settings = SINK_PROFILES[profile]
+        self.profile = profile
+        queue, sbcenc = _make_encoder(settings)
+        tee = gst.element_factory_make('tee')
+        self.add_many(queue, sbcenc, tee)
+        gst.element_link_many(queue, sbcenc, tee)
+        pad = queue.get_pad('sink')
+        ghost_pad = gst.GhostPad('sink', pad)
+        self.add_pad(ghost_pad)
+        self.queue = queue
+        self.sbcenc = sbcenc
+        self.tee = tee
+        self.members = {}
+        self.on_stall = None
+        self.adaptive = None
+        self.drain = None
+        if ('bitpool' in settings):
+            self.adaptive = AdaptiveBitpool(sbcenc, settings['bitpool'])
+            self.drain = _watch_drain(queue, self.adaptive)
+
+    def add_member(self, address):
+        if (address in self.members):
+            return
+        queue = gst.element_factory_make('queue')
+        for name, value in MEMBER_QUEUE.items():
+            queue.set_property(name, value)
+        a2dpsink = _make_a2dpsink(address)
+        self.add_many(queue, a2dpsink)
+        gst.element_link_many(queue, a2dpsink)
+        tee_pad = self.tee.get_request_pad('src%d')
+        tee_pad.link(queue.get_pad('sink'))
+        a2dpsink.sync_state_with_parent()
+        queue.sync_state_with_parent()
+        drain = DrainMonitor(queue)
+        drain.on_congested = functools.partial(self._on_member_congested, address)
+        drain.on_clear = functools.partial(self._set_member_leaky, address, False)
+        self.members[address] = (tee_pad, queue, a2dpsink, drain)
+
+    def _on_member_congested(self, address):
+        self._set_member_leaky(address, True)
+        if (self.on_stall is not None):
+            self.on_stall(address)
+
+    def _set_member_leaky(self, address, leaky):
+        branch = self.members.get(address)
+        if (branch is None):
+            return
+        queue = branch[1]
+        value = LEAKY_DOWNSTREAM if leaky else LEAKY_NONE
+        if (queue.get_property('leaky') != value):
+            queue.set_property('leaky', value)
+
+    def stalled(self):
+        """
+        Members whose queues are leaking because their links stalled
+        """
+        return sorted(address for address, branch in self.members.items()
+                      if branch[1].get_property('leaky') != LEAKY_NONE)
+
+    def buffered_bytes(self):
+        return (self.queue.get_property('current-level-bytes') +
+                sum(branch[1].get_property('current-level-bytes')
+                    for branch in self.members.values()))
+
+    def close(self):
+        if (self.drain is not None):
+            self.drain.stop()
+        for branch in self.members.values():
+            branch[3].stop()
+
+    def remove_member(self, address):
+        branch = self.members.pop(address, None)
+        if (branch is None):
+            return
+        tee_pad = branch[0]
+        branch[3].stop()
+        if (self.get_state(0)[1] == gst.STATE_PLAYING):
+            # Wait for data flow to the branch to stop before unlinking
+            tee_pad.set_blocked_async(True, self._on_member_blocked, branch)
+        else:
+            self._release_member(branch)
+
+    def _on_member_blocked(self, pad, blocked, branch):
+        self._release_member(branch)
+
+    def _release_member(self, branch):
+        tee_pad, queue, a2dpsink, _ = branch
+        tee_pad.unlink(queue.get_pad('sink'))
+        self.tee.release_request_pad(tee_pad)
+        for element in (queue, a2dpsink):
+            element.set_state(gst.STATE_NULL)
+            self.remove(element)
+
+
+class SinkPool(object):
+    """
+    Pool of pre-built :class:`BluetoothA2DPSink` bins.
+
+    Bins are built and linked ahead of time for known audio sink devices
+    and recycled when a device disconnects, so attaching a sink skips
+    building its elements.  Pooled bins are held in NULL state: bringing an
+    a2dpsink up to READY opens a connection to its device, which would
+    reconnect devices that were deliberately disconnected.  A bin for a device that has not been seen for
+    ``max_age`` seconds is evicted, as are the bins of the least recently
+    seen devices once there are more than ``size`` of them.
+    """
+    def __init__(self, size=4, max_age=3600):
+        self.size = size
+        self.max_age = max_age
+        self._bins = {}
+        self._seen = {}
+
+    def touch(self, address):
+        self._seen[address] = time.time()
+
+    def prewarm(self, address, profile):
+        if (self.size <= 0 or address in self._bins):
+            return
+        self.touch(address)
+        self._put(address, BluetoothA2DPSink(address, profile))
+
+    def acquire(self, address, profile):
+        """
+        Take a sink for a device from the pool, building one only if no
+        pooled bin with a matching profile is available
+        """
+        self.touch(address)
+        sink = self._bins.pop(address, None)
+        if (sink is not None):
+            if (sink.profile == profile):
+                return sink
+            SinkPool._discard(sink)
+        # Retarget the spare bin of the least recently seen device
+        spares = [(self._seen.get(addr, 0), addr) for addr, spare in self._bins.items()
+                  if spare.profile == profile]
+        if (spares):
+            sink = self._bins.pop(min(spares)[1])
+            sink.set_device(address)
+            return sink
+        return BluetoothA2DPSink(address, profile)
+
+    def release(self, address, sink):
+        """
+        Return a detached sink to the pool for reuse
+        """
+        if (self.size <= 0):
+            SinkPool._discard(sink)
+            return
+        old = self._bins.get(address)
+        if (old is not None and old is not sink):
+            SinkPool._discard(old)
+        self.touch(address)
+        self._put(address, sink)
+
+    def clear(self):
+        for sink in self._bins.values():
+            SinkPool._discard(sink)
+        self._bins.clear()
+
+    def stats(self):
+        return {'size': len(self._bins),
+                'devices': sorted(self._bins.keys())}
+
+    @staticmethod
+    def _discard(sink):
+        sink.close()
+        sink.set_state(gst.STATE_NULL)
+
+    def _put(self, address, sink):
+        if (sink.set_state(gst.STATE_NULL) == gst.STATE_CHANGE_FAILURE):
+            logger.warning('BTDeviceManager discarding sink of dev=%s that '
+                           'failed to stop', address)
+            sink.close()
+            return
+        self._bins[address] = sink
+        self.trim()
+
+    def trim(self):
+        """
+        Drop the bins that are too old or beyond the pool's size
+        """
+        now = time.time()
+        for address in list(self._bins.keys()):
+            if (now - self._seen.get(address, 0) > self.max_age):
+                SinkPool._discard(self._bins.pop(address))
+        while (len(self._bins) > self.size):
+            address = min(self._bins.keys(), key=lambda x: self._seen.get(x, 0))
+            SinkPool._discard(self._bins.pop(address))
@@ -0,0 +1,179 @@
+from __future__ import unicode_literals
+
+import bisect
+import contextlib
+import logging
+import threading
+import time
+
+import gobject
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                  1, 2.5, 5, 10, 30)
+
+
+class Histogram(object):
+    """
+    Fixed bucket latency histogram
+    """
+    __slots__ = ('bounds', 'buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if (self.min is None or value < self.min):
+            self.min = value
+        if (self.max is None or value > self.max):
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of values
+        """
+        if (not self.count):
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if (seen >= rank):
+                if (i < len(self.bounds)):
+                    return min(self.bounds[i], self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'min': self.min,
+                'max': self.max,
+                'p50': self.percentile(0.5),
+                'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99)}
+
+
+class DeviceStats(object):
+    """
+    Connection outcomes of a single device
+    """
+    __slots__ = ('connects', 'failures', 'time_to_connected')
+
+    def __init__(self):
+        self.connects = 0
+        self.failures = 0
+        self.time_to_connected = Histogram()
+
+    def to_dict(self):
+        return {'connects': self.connects,
+                'failures': self.failures,
+                'time_to_connected': self.time_to_connected.to_dict()}
+
+
+class Stats(object):
+    """
+    Counters and latency histograms for the device manager.
+
+    Latencies are recorded per operation with :meth:`timer` or
+    :meth:`observe`, signal arrivals with :meth:`signal` and connection
+    outcomes per device with :meth:`connect_result`.  Everything is
+    collected in memory and reported by :meth:`snapshot`, or logged every
+    ``interval`` seconds once :meth:`start_logging` has been called.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.counters = {}
+            self.signals = {}
+            self.latency = {}
+            self.devices = {}
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def signal(self, name):
+        with self._lock:
+            self.signals[name] = self.signals.get(name, 0) + 1
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.latency.get(name)
+            if (histogram is None):
+                histogram = self.latency[name] = Histogram()
+            histogram.add(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - started)
+
+    def connect_result(self, addr, success, elapsed=None):
+        with self._lock:
+            device = self.devices.get(addr)
+            if (device is None):
+                device = self.devices[addr] = DeviceStats()
+            if (success):
+                device.connects += 1
+                if (elapsed is not None):
+                    device.time_to_connected.add(elapsed)
+            else:
+                device.failures += 1
+        self.count('connect_success' if success else 'connect_failure')
+        if (success and elapsed is not None):
+            self.observe('time_to_connected', elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.time() - self.started
+            return {'uptime': uptime,
+                    'counters': dict(self.counters),
+                    'signals': dict((name, {'count': n,
+                                            'rate': n / uptime if uptime > 0 else 0.0})
+                                    for name, n in self.signals.items()),
+                    'latency': dict((name, h.to_dict())
+                                    for name, h in self.latency.items()),
+                    'devices': dict((addr, d.to_dict())
+                                    for addr, d in self.devices.items())}
+
+    def start_logging(self, interval):
+        self.stop_logging()
+        if (interval > 0):
+            self._timer = gobject.timeout_add(int(interval * 1000),
+                                              self._on_log_timer)
+
+    def stop_logging(self):
+        if (self._timer is not None):
+            gobject.source_remove(self._timer)
+            self._timer = None
+
+    def _on_log_timer(self):
+        snapshot = self.snapshot()
+        logger.info('BTDeviceManager stats counters=%s signals=%s',
+                    snapshot['counters'],
+                    dict((name, s['count']) for name, s in snapshot['signals'].items()))
+        for name, latency in sorted(snapshot['latency'].items()):
+            logger.info('BTDeviceManager stats latency=%s count=%d p50=%.1fms '
+                        'p90=%.1fms p99=%.1fms max=%.1fms', name, latency['count'],
+                        latency['p50'] * 1000, latency['p90'] * 1000,
+                        latency['p99'] * 1000, latency['max'] * 1000)
+        return True
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import fakebluez
+from benchmarks.bench import bluez, make_manager
+
+from mopidy import exceptions
+
+from mopidy_btmanager.connect import (STATE_CONNECTED, STATE_CONNECTING,
+                                      STATE_FAILED)
+
+
+class BTDeviceManagerTest(unittest.TestCase):
+
+    def start(self, devices=0, **overrides):
+        overrides.setdefault('autoconnect', False)
+        manager = make_manager(devices, **overrides)
+        manager.on_start()
+        self.addCleanup(manager.on_stop)
+        return manager
+
+    def connect(self, manager, dev):
+        manager.connect(dev)
+        fakebluez.pump(until=lambda: manager.get_connection_state(dev)['state'] !=
+                       STATE_CONNECTING)
+        return manager.get_connection_state(dev)['state']
+
+    def test_start_reads_properties_once_per_device(self):
+        bluez.property_reads = 0
+
+        manager = self.start(10)
+
+        self.assertEqual(len(manager.get_devices()), 10)
+        self.assertEqual(bluez.property_reads, 10)
+
+    def test_start_registers_agent_with_configured_adapters(self):
+        manager = make_manager(0, adapters=['hci1'], autoconnect=False)
+        bluez.add_devices(2, adapter_id='hci1')
+
+        manager.on_start()
+        self.addCleanup(manager.on_stop)
+
+        self.assertEqual([a['id'] for a in manager.get_adapters()], ['hci1'])
+        self.assertEqual(len(manager.get_adapters()[0]['devices']), 2)
+        self.assertIn('hci1', bluez.agents)
+
+    def test_connect_audio_sink(self):
+        manager = self.start(1)
+        dev = manager.get_devices()[0]
+
+        self.assertEqual(self.connect(manager, dev), STATE_CONNECTED)
+        self.assertTrue(manager.is_connected(dev))
+
+    def test_connect_speaker_with_remote_control(self):
+        manager = make_manager(0, autoconnect=False)
+        bluez.add_device('00:00:00:00:00:01',
+                         uuids=(fakebluez.AUDIO_SINK_UUID,
+                                fakebluez.AV_REMOTE_UUID))
+        manager.on_start()
+        self.addCleanup(manager.on_stop)
+        bluez.connects = 0
+        dev = manager.get_devices()[0]
+
+        self.assertEqual(self.connect(manager, dev), STATE_CONNECTED)
+        self.assertEqual(manager.get_connection_state(dev)['connected'],
+                         ['AudioSink'])
+        self.assertEqual(bluez.connects, 1)
+
+    def test_connect_failure(self):
+        manager = self.start(1)
+        dev = manager.get_devices()[0]
+        bluez.failing.add(dev['addr'])
+
+        self.assertEqual(self.connect(manager, dev), STATE_FAILED)
+        self.assertFalse(manager.is_connected(dev))
+
+    def test_remove_is_recorded_in_changes(self):
+        manager = self.start(2)
+        dev = manager.get_devices()[0]
+        version = manager.get_changes()['version']
+
+        manager.remove(dev)
+        bluez.emit_device_removed(fakebluez.FakeBluez.device_path(dev['addr']))
+
+        changes = manager.get_changes(version)['changes']
+        self.assertEqual([(c['addr'], c['change']) for c in changes],
+                         [(dev['addr'], 'removed')])
+        self.assertEqual(len(manager.get_devices()), 1)
+
+    def test_cache_follows_persisted_properties(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        manager = self.start(1, cache_file=os.path.join(tmp, 'devices.json'))
+        dev = manager.get_devices()[0]
+
+        bluez.emit_property_changed(fakebluez.FakeBluez.device_path(dev['addr']),
+                                    'Name', 'Kitchen')
+
+        self.assertEqual(manager.cache.records[dev['addr']]['name'], 'Kitchen')
+
+    def test_disconnect_many(self):
+        manager = self.start(3)
+        devs = manager.get_devices()
+        for dev in devs[:2]:
+            self.connect(manager, dev)
+        bluez.devices.pop(fakebluez.FakeBluez.device_path(devs[2]['addr']))
+
+        results = manager.disconnect_many(devs)
+        fakebluez.pump(until=lambda: not any(manager.is_connected(dev)
+                                             for dev in devs[:2]))
+
+        self.assertEqual(results, {devs[0]['addr']: None,
+                                   devs[1]['addr']: None,
+                                   devs[2]['addr']: False})
+        self.assertFalse(manager.is_connected(devs[0]))
+        self.assertFalse(manager.is_connected(devs[1]))
+        self.assertTrue(manager.scheduler.is_held(devs[0]['addr']))
+
+    def test_pair_when_stopped_raises_extension_error(self):
+        manager = make_manager(0, autoconnect=False)
+        manager.on_start()
+        manager.disable()
+
+        with self.assertRaises(exceptions.ExtensionError):
+            manager.pair({'addr': '00:00:00:00:00:01'})
+
+    def test_addresses_match_case_insensitively(self):
+        manager = make_manager(0, autoconnect=False)
+        bluez.add_device('AA:BB:CC:DD:EE:FF')
+        manager.on_start()
+        self.addCleanup(manager.on_stop)
+        dev = {'addr': 'aa:bb:cc:dd:ee:ff'}
+
+        self.assertTrue(manager.is_paired(dev))
+        self.assertEqual(self.connect(manager, dev), STATE_CONNECTED)
+        self.assertTrue(manager.is_connected(dev))
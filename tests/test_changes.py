@@ -0,0 +1,78 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy_btmanager.changes import (CHANGE_ADDED, CHANGE_REMOVED,
+                                      CHANGE_UPDATED, ChangeFeed)
+
+ADDR = '00:11:22:33:44:55'
+
+
+def snapshot():
+    return [{'addr': ADDR, 'properties': {}}]
+
+
+class ChangeFeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.feed = ChangeFeed(max_size=3)
+
+    def test_record_numbers_changes(self):
+        self.assertEqual(self.feed.record(ADDR, CHANGE_ADDED), 1)
+        self.assertEqual(self.feed.record(ADDR, CHANGE_UPDATED, {'Name': 'x'}), 2)
+        self.assertEqual(self.feed.version, 2)
+
+    def test_since_returns_later_changes(self):
+        self.feed.record(ADDR, CHANGE_ADDED)
+        self.feed.record(ADDR, CHANGE_UPDATED, {'Name': 'x'})
+        self.feed.record(ADDR, CHANGE_REMOVED)
+
+        result = self.feed.since(1, snapshot)
+
+        self.assertEqual(result['version'], 3)
+        self.assertEqual([c['change'] for c in result['changes']],
+                         [CHANGE_UPDATED, CHANGE_REMOVED])
+        self.assertEqual(result['changes'][0]['properties'], {'Name': 'x'})
+
+    def test_since_current_version_is_empty(self):
+        self.feed.record(ADDR, CHANGE_ADDED)
+
+        self.assertEqual(self.feed.since(1, snapshot),
+                         {'version': 1, 'changes': []})
+
+    def test_since_too_old_version_returns_snapshot(self):
+        for i in range(5):
+            self.feed.record(ADDR, CHANGE_UPDATED)
+
+        result = self.feed.since(1, snapshot)
+
+        self.assertEqual(result, {'version': 5, 'snapshot': snapshot()})
+
+    def test_since_oldest_held_version_returns_changes(self):
+        for i in range(5):
+            self.feed.record(ADDR, CHANGE_UPDATED)
+
+        result = self.feed.since(2, snapshot)
+
+        self.assertEqual([c['version'] for c in result['changes']], [3, 4, 5])
+
+    def test_since_version_ahead_returns_snapshot(self):
+        self.feed.record(ADDR, CHANGE_ADDED)
+
+        self.assertIn('snapshot', self.feed.since(10, snapshot))
+
+    def test_reset_sends_everyone_a_snapshot(self):
+        self.feed.record(ADDR, CHANGE_ADDED)
+        self.feed.reset()
+
+        self.assertIn('snapshot', self.feed.since(1, snapshot))
+
+    def test_max_size_keeps_latest_changes(self):
+        for i in range(3):
+            self.feed.record(ADDR, CHANGE_UPDATED)
+
+        self.feed.max_size = 1
+
+        self.assertEqual(self.feed.max_size, 1)
+        self.assertEqual(len(self.feed.since(2, snapshot)['changes']), 1)
+        self.assertIn('snapshot', self.feed.since(1, snapshot))
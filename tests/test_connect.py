@@ -0,0 +1,126 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy_btmanager.connect import (ConnectEngine, STATE_CONNECTED,
+                                      STATE_CONNECTING, STATE_FAILED,
+                                      STATE_IDLE)
+
+
+class FakeInterface(object):
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def Connect(self, reply_handler, error_handler, timeout):
+        if (self.error is not None):
+            raise self.error
+        self.calls.append((reply_handler, error_handler))
+
+    def reply(self):
+        self.calls.pop(0)[0]()
+
+    def fail(self, error):
+        self.calls.pop(0)[1](error)
+
+
+class FakeProfile(object):
+
+    def __init__(self, error=None):
+        self._interface = FakeInterface(error)
+
+
+class ConnectEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.completed = []
+        self.engine = ConnectEngine(on_complete=self.completed.append)
+        self.sink = FakeProfile()
+        self.control = FakeProfile()
+
+    def connect(self):
+        return self.engine.connect('A', [('AudioSink', self.sink),
+                                         ('InputControl', self.control)])
+
+    def test_connect_does_not_block(self):
+        attempt = self.connect()
+
+        self.assertEqual(attempt.state, STATE_CONNECTING)
+        self.assertTrue(self.engine.is_connecting('A'))
+        self.assertEqual(self.completed, [])
+
+    def test_all_profiles_connected(self):
+        attempt = self.connect()
+
+        self.sink._interface.reply()
+        self.control._interface.reply()
+
+        self.assertEqual(attempt.state, STATE_CONNECTED)
+        self.assertEqual(attempt.connected, ['AudioSink', 'InputControl'])
+        self.assertEqual(self.completed, [attempt])
+
+    def test_partial_success_is_connected(self):
+        attempt = self.connect()
+
+        self.sink._interface.reply()
+        self.control._interface.fail(Exception('refused'))
+
+        self.assertEqual(attempt.state, STATE_CONNECTED)
+        self.assertEqual(len(attempt.errors), 1)
+
+    def test_all_profiles_failed(self):
+        attempt = self.connect()
+
+        self.sink._interface.fail(Exception('timeout'))
+        self.control._interface.fail(Exception('refused'))
+
+        self.assertEqual(attempt.state, STATE_FAILED)
+        self.assertEqual(self.completed, [attempt])
+
+    def test_connect_raising_counts_as_failure(self):
+        self.control = FakeProfile(Exception('no adapter'))
+
+        attempt = self.connect()
+        self.sink._interface.reply()
+
+        self.assertEqual(attempt.state, STATE_CONNECTED)
+        self.assertEqual(attempt.connected, ['AudioSink'])
+
+    def test_no_profiles_fails_immediately(self):
+        attempt = self.engine.connect('A', [])
+
+        self.assertEqual(attempt.state, STATE_FAILED)
+        self.assertEqual(self.completed, [attempt])
+
+    def test_connected_signal_before_reply_completes_once(self):
+        attempt = self.connect()
+
+        self.engine.set_connected('A', True)
+        self.assertEqual(attempt.state, STATE_CONNECTING)
+        self.sink._interface.reply()
+        self.control._interface.reply()
+
+        self.assertEqual(attempt.state, STATE_CONNECTED)
+        self.assertEqual(self.completed, [attempt])
+
+    def test_connect_in_progress_is_reused(self):
+        attempt = self.connect()
+
+        self.assertIs(self.connect(), attempt)
+        self.assertEqual(len(self.sink._interface.calls), 1)
+
+    def test_set_connected_tracks_idle_devices(self):
+        self.engine.set_connected('A', True)
+        self.assertEqual(self.engine.state('A'), STATE_CONNECTED)
+
+        self.engine.set_connected('A', False)
+        self.assertEqual(self.engine.state('A'), STATE_IDLE)
+
+    def test_wait_returns_final_state(self):
+        self.connect()
+        self.sink._interface.reply()
+        self.control._interface.reply()
+
+        self.assertEqual(self.engine.wait('A', timeout=1), STATE_CONNECTED)
+        self.assertEqual(self.engine.wait('B', timeout=1), STATE_IDLE)
@@ -0,0 +1,47 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy_btmanager.discovery import DiscoveryCoalescer
+
+ADDR = '00:11:22:33:44:55'
+UUIDS = ['0000110b-0000-1000-8000-00805f9b34fb']
+
+
+class DiscoveryCoalescerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = DiscoveryCoalescer(window=30, rssi_delta=10)
+        self.assertTrue(self.coalescer.offer(ADDR, 'speaker', UUIDS, -60, now=0))
+
+    def test_identical_report_is_dropped(self):
+        self.assertFalse(self.coalescer.offer(ADDR, 'speaker', UUIDS, -60, now=1))
+        self.assertEqual(self.coalescer.stats()['dropped'], 1)
+
+    def test_rssi_jitter_is_coalesced(self):
+        self.assertFalse(self.coalescer.offer(ADDR, 'speaker', UUIDS, -65, now=1))
+        self.assertEqual(self.coalescer.stats()['coalesced'], 1)
+
+    def test_rssi_change_is_emitted(self):
+        self.assertTrue(self.coalescer.offer(ADDR, 'speaker', UUIDS, -75, now=1))
+
+    def test_rssi_change_is_measured_from_last_emitted(self):
+        self.coalescer.offer(ADDR, 'speaker', UUIDS, -65, now=1)
+
+        self.assertFalse(self.coalescer.offer(ADDR, 'speaker', UUIDS, -68, now=2))
+
+    def test_name_change_is_emitted(self):
+        self.assertTrue(self.coalescer.offer(ADDR, 'kitchen', UUIDS, -60, now=1))
+
+    def test_uuid_change_is_emitted(self):
+        uuids = UUIDS + ['0000110e-0000-1000-8000-00805f9b34fb']
+
+        self.assertTrue(self.coalescer.offer(ADDR, 'speaker', uuids, -60, now=1))
+
+    def test_report_after_window_is_emitted(self):
+        self.assertTrue(self.coalescer.offer(ADDR, 'speaker', UUIDS, -60, now=30))
+
+    def test_forgotten_device_is_emitted(self):
+        self.coalescer.forget(ADDR)
+
+        self.assertTrue(self.coalescer.offer(ADDR, 'speaker', UUIDS, -60, now=1))
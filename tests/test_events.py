@@ -0,0 +1,106 @@
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+import mock
+
+from mopidy_btmanager.events import EventDispatcher
+
+
+def device(addr):
+    return {'addr': addr}
+
+
+class EventDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch(
+            'mopidy_btmanager.events.service.ServiceListener.send')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dispatcher = EventDispatcher(max_size=3, batch_window=0)
+
+    def deliver(self):
+        self.dispatcher.start()
+        self.dispatcher.stop(timeout=5)
+        return [(c[0][0], c[1]) for c in self.send.call_args_list]
+
+    def test_events_are_delivered_in_order(self):
+        self.dispatcher.send('bluetooth_device_connected', device=device('A'))
+        self.dispatcher.send('bluetooth_device_disconnected',
+                             device=device('A'))
+
+        events = self.deliver()
+
+        self.assertEqual([e for e, _ in events],
+                         ['bluetooth_device_connected',
+                          'bluetooth_device_disconnected'])
+        self.assertEqual(self.dispatcher.stats()['delivered'], 2)
+
+    def test_property_changes_are_merged(self):
+        self.dispatcher.send('bluetooth_device_property_changed',
+                             device=device('A'), property_dict={'Name': 'x'})
+        self.dispatcher.send('bluetooth_device_property_changed',
+                             device=device('A'), property_dict={'RSSI': -50})
+        self.dispatcher.send('bluetooth_device_property_changed',
+                             device=device('B'), property_dict={'Name': 'y'})
+
+        events = self.deliver()
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0][1]['property_dict'],
+                         {'Name': 'x', 'RSSI': -50})
+        self.assertEqual(self.dispatcher.stats()['merged'], 1)
+
+    def test_property_changes_are_not_merged_across_other_events(self):
+        self.dispatcher.send('bluetooth_device_property_changed',
+                             device=device('A'), property_dict={'Name': 'x'})
+        self.dispatcher.send('bluetooth_device_connected', device=device('A'))
+        self.dispatcher.send('bluetooth_device_property_changed',
+                             device=device('A'), property_dict={'Name': 'y'})
+
+        events = self.deliver()
+
+        self.assertEqual([e[1].get('property_dict') for e in events],
+                         [{'Name': 'x'}, None, {'Name': 'y'}])
+
+    def test_overflow_drops_all_but_critical_events(self):
+        for addr in 'ABCD':
+            self.dispatcher.send('bluetooth_device_property_changed',
+                                 device=device(addr),
+                                 property_dict={'Name': addr})
+        self.dispatcher.send('bluetooth_device_connected', device=device('E'))
+
+        events = self.deliver()
+
+        self.assertEqual([e[1]['device']['addr'] for e in events],
+                         ['A', 'B', 'C', 'E'])
+        self.assertEqual(self.dispatcher.stats()['dropped'], 1)
+
+    def test_listener_errors_do_not_stop_delivery(self):
+        self.send.side_effect = [Exception('boom'), None]
+        self.dispatcher.send('bluetooth_device_connected', device=device('A'))
+        self.dispatcher.send('bluetooth_device_connected', device=device('B'))
+
+        self.deliver()
+
+        self.assertEqual(self.send.call_count, 2)
+        self.assertEqual(self.dispatcher.stats()['delivered'], 2)
+
+    def test_restart_while_delivering_keeps_a_single_thread(self):
+        release = threading.Event()
+        self.send.side_effect = lambda event, **kwargs: release.wait(5)
+        self.dispatcher.send('bluetooth_device_connected', device=device('A'))
+        self.dispatcher.start()
+        self.dispatcher.stop(timeout=0.05)
+
+        self.dispatcher.start()
+        self.dispatcher.send('bluetooth_device_connected', device=device('B'))
+        release.set()
+        self.dispatcher.stop(timeout=5)
+
+        self.assertEqual([c[1]['device']['addr']
+                          for c in self.send.call_args_list], ['A', 'B'])
+        self.assertEqual([t for t in threading.enumerate()
+                          if t.name == 'BTDeviceManagerEvents'], [])
@@ -0,0 +1,36 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy_btmanager import Extension, SinkDeviceProfiles
+
+
+class ExtensionTest(unittest.TestCase):
+
+    def test_get_default_config(self):
+        ext = Extension()
+
+        config = ext.get_default_config()
+
+        self.assertIn('[btmanager]', config)
+        self.assertIn('enabled = true', config)
+
+    def test_get_config_schema(self):
+        ext = Extension()
+
+        schema = ext.get_config_schema()
+
+        self.assertIn('autoconnect', schema)
+        self.assertIn('sink_profile', schema)
+        self.assertIn('sink_device_profiles', schema)
+
+    def test_sink_device_profiles_accepts_known_profiles(self):
+        value = SinkDeviceProfiles().deserialize('aa:bb:cc:dd:ee:ff=low_latency')
+
+        self.assertEqual(value, ('aa:bb:cc:dd:ee:ff=low_latency',))
+
+    def test_sink_device_profiles_rejects_unknown_profiles(self):
+        self.assertRaises(ValueError, SinkDeviceProfiles().deserialize,
+                          'aa:bb:cc:dd:ee:ff=loud')
+        self.assertRaises(ValueError, SinkDeviceProfiles().deserialize,
+                          'low_latency')
@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy_btmanager.linkquality import LinkMonitor
+
+
+class LinkMonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.links = LinkMonitor(window=5, rssi_threshold=-80, period=30,
+                                 burst=3, max_size=2)
+
+    def test_unknown_link_is_not_degrading(self):
+        self.assertFalse(self.links.is_degrading('A'))
+        self.assertIsNone(self.links.rssi('A'))
+
+    def test_falling_rssi_below_threshold_is_degrading(self):
+        for rssi in (-60, -70, -82, -85, -90):
+            self.links.record_rssi('A', rssi)
+
+        self.assertTrue(self.links.is_degrading('A'))
+        self.assertEqual(self.links.rssi('A'), -77.4)
+
+    def test_weak_but_steady_rssi_is_not_degrading(self):
+        for rssi in (-85, -84, -85, -86):
+            self.links.record_rssi('A', rssi)
+
+        self.assertFalse(self.links.is_degrading('A'))
+
+    def test_stalls_within_period_are_degrading(self):
+        for now in (100, 110, 120):
+            self.links.record_stall('A', now)
+
+        self.assertTrue(self.links.is_degrading('A', now=125))
+        self.assertFalse(self.links.is_degrading('A', now=145))
+
+    def test_drops_within_period_are_degrading(self):
+        for now in (100, 101, 102):
+            self.links.record_drop('A', now)
+
+        self.assertTrue(self.links.is_degrading('A', now=103))
+
+    def test_sort_key_orders_strongest_first(self):
+        self.links.record_rssi('A', -70)
+        self.links.record_rssi('B', -50)
+
+        self.assertEqual(sorted('ABC', key=self.links.sort_key), ['B', 'A', 'C'])
+
+    def test_least_recently_updated_link_is_forgotten(self):
+        self.links.record_rssi('A', -70, now=1)
+        self.links.record_rssi('B', -70, now=2)
+        self.links.record_rssi('C', -70, now=3)
+
+        self.assertEqual(sorted(self.links.stats()), ['B', 'C'])
+
+    def test_window_change_resizes_known_links(self):
+        for rssi in (-60, -61, -62, -63, -64):
+            self.links.record_rssi('A', rssi)
+
+        self.links.window = 3
+        self.links.record_rssi('A', -65)
+
+        self.assertEqual(self.links.stats()['A']['rssi'], [-63, -64, -65])
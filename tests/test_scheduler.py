@@ -0,0 +1,117 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import mock
+
+from mopidy_btmanager.connect import (STATE_CONNECTED, STATE_CONNECTING,
+                                      STATE_FAILED)
+from mopidy_btmanager.scheduler import AutoconnectScheduler
+
+
+class AutoconnectSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('mopidy_btmanager.scheduler.gobject')
+        self.gobject = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.started = []
+        self.result = STATE_CONNECTING
+        self.scheduler = AutoconnectScheduler(self.connect, concurrency=1,
+                                              backoff=5, jitter=0)
+        self.scheduler.start()
+
+    def connect(self, addr):
+        self.started.append(addr)
+        return self.result
+
+    def test_request_starts_connect(self):
+        self.scheduler.request('A')
+
+        self.assertEqual(self.started, ['A'])
+        self.assertEqual(self.scheduler.stats()['active'], ['A'])
+
+    def test_concurrency_is_capped(self):
+        for addr in 'ABC':
+            self.scheduler.request(addr)
+
+        self.assertEqual(self.started, ['A'])
+        self.assertEqual(self.scheduler.stats()['queued'], ['B', 'C'])
+
+        self.scheduler.completed('A', True)
+
+        self.assertEqual(self.started, ['A', 'B'])
+
+    def test_priority_orders_queued_devices(self):
+        self.scheduler.priority = ['kitchen', 'C']
+        self.scheduler.request('A')
+        self.scheduler.request('B')
+        self.scheduler.request('C')
+        self.scheduler.request('D', 'kitchen')
+
+        self.scheduler.completed('A', True)
+        self.scheduler.completed('D', True)
+        self.scheduler.completed('C', True)
+
+        self.assertEqual(self.started, ['A', 'D', 'C', 'B'])
+
+    def test_key_fn_orders_devices_of_same_rank(self):
+        scheduler = AutoconnectScheduler(self.connect, concurrency=1,
+                                         key_fn={'A': 0, 'B': 2, 'C': 1}.get)
+        scheduler.start()
+        for addr in 'ABC':
+            scheduler.request(addr)
+
+        scheduler.completed('A', True)
+        scheduler.completed('C', True)
+
+        self.assertEqual(self.started, ['A', 'C', 'B'])
+
+    def test_failure_backs_off(self):
+        self.result = STATE_FAILED
+        self.scheduler.request('A')
+        self.scheduler.request('A')
+
+        self.assertEqual(self.started, ['A'])
+        self.assertEqual(self.scheduler.stats()['queued'], ['A'])
+        self.assertAlmostEqual(self.scheduler.stats()['backoff']['A'], 5, places=0)
+        self.assertTrue(self.gobject.timeout_add.called)
+
+    def test_backoff_doubles_up_to_maximum(self):
+        self.scheduler.backoff_max = 15
+        self.result = STATE_FAILED
+        delays = []
+        for i in range(3):
+            self.scheduler.request('A')
+            delays.append(round(self.scheduler.stats()['backoff']['A']))
+            self.scheduler._backoff['A'].next_time = 0
+
+        self.assertEqual(delays, [5, 10, 15])
+
+    def test_success_clears_backoff(self):
+        self.result = STATE_FAILED
+        self.scheduler.request('A')
+        self.scheduler._backoff['A'].next_time = 0
+        self.result = STATE_CONNECTED
+        self.scheduler.request('A')
+
+        self.assertEqual(self.started, ['A', 'A'])
+        self.assertEqual(self.scheduler.stats()['backoff'], {})
+
+    def test_held_device_is_not_connected(self):
+        self.scheduler.hold('A')
+        self.scheduler.request('A')
+
+        self.assertEqual(self.started, [])
+        self.assertTrue(self.scheduler.is_held('A'))
+
+        self.scheduler.release('A')
+        self.scheduler.request('A')
+
+        self.assertEqual(self.started, ['A'])
+
+    def test_stopped_scheduler_ignores_requests(self):
+        self.scheduler.stop()
+        self.scheduler.request('A')
+
+        self.assertEqual(self.started, [])